@@ -1,10 +1,17 @@
 import streamlit as st
 from datetime import date, datetime, timedelta, time
+import base64
 import calendar
-import json
+import io
 import os
-import plotly.graph_objects as go
-import sqlite3
+from drpill.adherence import adherence_percent, calculate_weekly_adherence, get_adherence_report, get_adherence_stats, get_month_calendar, rebuild_daily_adherence
+from drpill.db import DB_PATH, init_database
+from drpill.exports import EXPORT_TABLES, PARQUET_AVAILABLE, export_user_bytes, import_user_data, read_backup_file, write_table_export
+from drpill.medicines import delete_medicine, get_medicines_for_date, get_user_medicines, save_medicine, toggle_medicine_pause, update_medicine
+from drpill.profiling import QueryProfile, current_profile, finish_rerun_profile, get_profile_stats
+from drpill.scheduling import get_medicine_status, get_reminder_scheduler, get_upcoming_reminders
+from drpill.tracking import clear_tracking_for_medicines, get_all_tracking_records, get_intake_records, get_intake_status_map, get_taken_counts, toggle_intake
+from drpill.users import create_user, delete_user_account, get_settings, get_user_by_id, login_user, update_settings, update_user
 
 st.set_page_config(
     page_title="Dr.Pill - Medicine Tracker",
@@ -271,591 +278,61 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-DB_PATH = "drpill.db"
-
-def get_db_connection():
-    """Create database connection"""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_database():
-    """Initialize database tables"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT,
-        email TEXT UNIQUE,
-        password TEXT,
-        age INTEGER,
-        conditions TEXT,
-        phone TEXT,
-        email_address TEXT
-    )
-    """)
-    
-    
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS medicines (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        name TEXT,
-        dosage TEXT,
-        med_type TEXT,
-        times TEXT,
-        time_labels TEXT,
-        notes TEXT,
-        start_date TEXT,
-        end_date TEXT,
-        paused BOOLEAN DEFAULT 0,
-        color TEXT DEFAULT '#9c27b0',
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    """)
-    
-    
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS tracking (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        medicine_id INTEGER,
-        date TEXT,
-        time_slot TEXT,
-        taken BOOLEAN DEFAULT 0,
-        timestamp DATETIME,
-        FOREIGN KEY (medicine_id) REFERENCES medicines(id)
-    )
-    """)
-    
-   
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS settings (
-        user_id INTEGER PRIMARY KEY,
-        reminders_enabled BOOLEAN DEFAULT 1,
-        reminder_advance_minutes INTEGER DEFAULT 30,
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )
-    """)
-    
-    conn.commit()
-    conn.close()
-
-
-init_database()
-
-
-def create_user(name, email, password, age, conditions="", phone="", email_address=""):
-    """Create a new user in database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute(
-            "INSERT INTO users (name, email, password, age, conditions, phone, email_address) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (name, email, password, age, conditions, phone, email_address)
-        )
-        
-        user_id = cursor.lastrowid
-        
-        # Create default settings for new user
-        cursor.execute(
-            "INSERT INTO settings (user_id, reminders_enabled, reminder_advance_minutes) VALUES (?, 1, 30)",
-            (user_id,)
-        )
-        
-        conn.commit()
-        conn.close()
-        return True
-    except sqlite3.IntegrityError:
-        conn.close()
-        return False
-
-def login_user(email, password):
-    """Authenticate user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT * FROM users WHERE email=? AND password=?",
-        (email, password)
-    )
-    user = cursor.fetchone()
-    conn.close()
-    
-    if user:
-        return (user['id'], user['name'], user['email'], user['password'],
-               user['age'], user['conditions'], user['phone'], user['email_address'])
-    return None
-
-def get_user_by_id(user_id):
-    """Get user by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM users WHERE id=?", (user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    
-    if user:
-        return (user['id'], user['name'], user['email'], user['password'],
-               user['age'], user['conditions'], user['phone'], user['email_address'])
-    return None
-
-def update_user(user_id, name, age, conditions, phone, email_address):
-    """Update user information"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "UPDATE users SET name=?, age=?, conditions=?, phone=?, email_address=? WHERE id=?",
-        (name, age, conditions, phone, email_address, user_id)
-    )
-    
-    conn.commit()
-    conn.close()
-
-def save_medicine(user_id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, color):
-    """Save a new medicine"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "INSERT INTO medicines (user_id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, color) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (user_id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, color)
-    )
-    
-    med_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    
-    return med_id
-
-def get_user_medicines(user_id):
-    """Get all medicines for a user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM medicines WHERE user_id=?", (user_id,))
-    medicines = cursor.fetchall()
-    conn.close()
-    
-    result = []
-    for med in medicines:
-        result.append((
-            med['id'], med['user_id'], med['name'], med['dosage'],
-            med['med_type'], med['times'], med['time_labels'], med['notes'],
-            med['start_date'], med['end_date'], med['paused'], med['color']
-        ))
-    return result
-
-def get_medicine_by_id(med_id):
-    """Get medicine by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM medicines WHERE id=?", (med_id,))
-    med = cursor.fetchone()
-    conn.close()
-    
-    if med:
-        return (
-            med['id'], med['user_id'], med['name'], med['dosage'],
-            med['med_type'], med['times'], med['time_labels'], med['notes'],
-            med['start_date'], med['end_date'], med['paused'], med['color']
-        )
-    return None
-
-def update_medicine(med_id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, color):
-    """Update medicine"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "UPDATE medicines SET name=?, dosage=?, med_type=?, times=?, time_labels=?, notes=?, start_date=?, end_date=?, color=? WHERE id=?",
-        (name, dosage, med_type, times, time_labels, notes, start_date, end_date, color, med_id)
-    )
-    
-    conn.commit()
-    conn.close()
-
-def delete_medicine(med_id):
-    """Delete medicine"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("DELETE FROM medicines WHERE id=?", (med_id,))
-    cursor.execute("DELETE FROM tracking WHERE medicine_id=?", (med_id,))
-    
-    conn.commit()
-    conn.close()
-
-def toggle_medicine_pause(med_id):
-    """Toggle medicine pause status"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("UPDATE medicines SET paused = NOT paused WHERE id=?", (med_id,))
-    
-    conn.commit()
-    conn.close()
-
-def get_medicines_for_date(user_id, target_date):
-    """Get medicines scheduled for a specific date"""
-    medicines = get_user_medicines(user_id)
-    scheduled_meds = []
-    
-    for med in medicines:
-        med_id, user_id_val, name, dosage, med_type, times_str, time_labels_str, notes, start_date, end_date, paused, color = med
-        time_slots = [t.strip() for t in times_str.split(",") if t.strip()]
-        time_labels = [l.strip() for l in time_labels_str.split(",") if l.strip()] if time_labels_str else [""] * len(time_slots)
-        
-        if paused:
+# Runs once per process; later reruns only pay a cache lookup
+@st.cache_resource
+def bootstrap():
+    """One-time process setup: migrate the database and start the reminder scheduler"""
+    schema_version = init_database(DB_PATH)
+    get_reminder_scheduler()
+    return schema_version
+
+
+bootstrap()
+
+
+def start_rerun_profile(page):
+    """Start recording this rerun, closing one that st.rerun() cut short"""
+    previous = st.session_state.get('rerun_profile')
+    if previous is not None and previous.wall_time is None:
+        finish_rerun_profile(previous, cut_short=True)
+    profile = QueryProfile(page)
+    current_profile.set(profile)
+    st.session_state.rerun_profile = profile
+    return profile
+
+
+MASCOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mascots")
+MASCOT_WIDTH = 160
+MASCOT_FILES = {
+    'happy': 'happy_pill.png',
+    'sad': 'sad_pill.png',
+    'urgent': 'angry_pill.png',
+    'sleepy': 'sleepy_pill.png'
+}
+
+
+@st.cache_resource
+def load_mascots():
+    """Read every mascot PNG once, downsized to its rendered width, as base64 data URIs"""
+    from PIL import Image
+    
+    mascots = {}
+    for emotion, file_name in MASCOT_FILES.items():
+        try:
+            with Image.open(os.path.join(MASCOT_DIR, file_name)) as image:
+                if image.width > MASCOT_WIDTH:
+                    height = round(image.height * MASCOT_WIDTH / image.width)
+                    image = image.resize((MASCOT_WIDTH, height), Image.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, format="PNG", optimize=True)
+        except OSError:
             continue
-        
-        if med_type == 'Daily (Ongoing)' or (med_type == 'Date Range' and start_date and end_date and start_date <= target_date <= end_date):
-            if time_slots:
-                scheduled_meds.append({
-                    'id': med_id,
-                    'name': name,
-                    'dosage': dosage,
-                    'times': time_slots,
-                    'time_labels': time_labels,
-                    'notes': notes,
-                    'paused': paused,
-                    'color': color
-                })
-    
-    return scheduled_meds
-
-def toggle_intake(medicine_id, target_date, time_slot):
-    """Toggle medicine intake"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT id, taken FROM tracking WHERE medicine_id=? AND date=? AND time_slot=?",
-        (medicine_id, target_date, time_slot)
-    )
-    result = cursor.fetchone()
-    
-    if result:
-        track_id = result['id']
-        taken = result['taken']
-        cursor.execute(
-            "UPDATE tracking SET taken=?, timestamp=? WHERE id=?",
-            (not taken, datetime.now() if not taken else None, track_id)
-        )
-    else:
-        cursor.execute(
-            "INSERT INTO tracking (medicine_id, date, time_slot, taken, timestamp) VALUES (?, ?, ?, ?, ?)",
-            (medicine_id, target_date, time_slot, True, datetime.now())
-        )
-    
-    conn.commit()
-    conn.close()
-
-def get_intake_status(medicine_id, target_date, time_slot):
-    """Check if medicine was taken"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "SELECT taken FROM tracking WHERE medicine_id=? AND date=? AND time_slot=?",
-        (medicine_id, target_date, time_slot)
-    )
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result['taken'] if result else False
-
-def get_tracking_records_for_medicine(med_id):
-    """Get all tracking records for a specific medicine"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM tracking WHERE medicine_id=?", (med_id,))
-    records = cursor.fetchall()
-    conn.close()
-    
-    return records
+        mascots[emotion] = "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+    return mascots
 
-def get_total_taken_count(med_id):
-    """Get total number of times a medicine was taken"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) as count FROM tracking WHERE medicine_id=? AND taken=1", (med_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    return result['count'] if result else 0
-
-def calculate_adherence(user_id, target_date):
-    """Calculate adherence percentage"""
-    scheduled_meds = get_medicines_for_date(user_id, target_date)
-    if not scheduled_meds:
-        return 100
-    
-    total_slots = 0
-    taken_slots = 0
-    
-    for med in scheduled_meds:
-        for time_slot in med['times']:
-            total_slots += 1
-            if get_intake_status(med['id'], target_date, time_slot):
-                taken_slots += 1
-    
-    if total_slots == 0:
-        return 100
-    
-    return int((taken_slots / total_slots) * 100)
-
-def calculate_weekly_adherence(user_id):
-    """Calculate weekly adherence"""
-    weekly_data = {}
-    for i in range(7):
-        d = date.today()
-        target_date = (d - timedelta(days=6-i)).strftime('%Y-%m-%d')
-        day_name = (d - timedelta(days=6-i)).strftime('%a')
-        adherence = calculate_adherence(user_id, target_date)
-        weekly_data[day_name] = adherence
-    
-    return weekly_data
-
-def get_adherence_stats(user_id):
-    """Get adherence statistics"""
-    today = date.today().strftime("%Y-%m-%d")
-    today_adherence = calculate_adherence(user_id, today)
-    medicines = get_user_medicines(user_id)
-    total_meds = len(medicines)
-    active_meds = len([m for m in medicines if not m[10]])
-    
-    
-    last_7_days = []
-    for i in range(7):
-        d = date.today()
-        target_date = (d - timedelta(days=i)).strftime("%Y-%m-%d")
-        adherence = calculate_adherence(user_id, target_date)
-        last_7_days.append(adherence)
-    
-    avg_adherence = sum(last_7_days) / len(last_7_days) if last_7_days else 100
-    
-    
-    total_scheduled_30d = 0
-    total_taken_30d = 0
-    for i in range(30):
-        check_date = (date.today() - timedelta(days=i)).strftime('%Y-%m-%d')
-        meds_for_date = get_medicines_for_date(user_id, check_date)
-        for med in meds_for_date:
-            for time_slot in med['times']:
-                total_scheduled_30d += 1
-                if get_intake_status(med['id'], check_date, time_slot):
-                    total_taken_30d += 1
-    
-    overall_adherence = int((total_taken_30d / total_scheduled_30d * 100)) if total_scheduled_30d > 0 else 0
-    
-    return {
-        'today_adherence': today_adherence,
-        'total_medicines': total_meds,
-        'active_medicines': active_meds,
-        'avg_adherence': int(avg_adherence),
-        'last_7_days': last_7_days,
-        'overall_adherence': overall_adherence
-    }
-
-def get_settings(user_id):
-    """Get user settings"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM settings WHERE user_id=?", (user_id,))
-    result = cursor.fetchone()
-    conn.close()
-    
-    if result:
-        return {
-            'reminders_enabled': result['reminders_enabled'],
-            'reminder_advance_minutes': result['reminder_advance_minutes']
-        }
-    else:
-        # Create default settings
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO settings (user_id, reminders_enabled, reminder_advance_minutes) VALUES (?, 1, 30)",
-            (user_id,)
-        )
-        conn.commit()
-        conn.close()
-        return {'reminders_enabled': True, 'reminder_advance_minutes': 30}
-
-def update_settings(user_id, reminders_enabled, reminder_advance_minutes):
-    """Update user settings"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "UPDATE settings SET reminders_enabled=?, reminder_advance_minutes=? WHERE user_id=?",
-        (reminders_enabled, reminder_advance_minutes, user_id)
-    )
-    
-    conn.commit()
-    conn.close()
-
-def get_upcoming_reminders(user_id):
-    """Get upcoming reminders"""
-    current_time = datetime.now()
-    today = current_time.strftime('%Y-%m-%d')
-    today_medicines = get_medicines_for_date(user_id, today)
-    settings = get_settings(user_id)
-    
-    upcoming = []
-    for medicine in today_medicines:
-        for time_slot in medicine['times']:
-            is_taken = get_intake_status(medicine['id'], today, time_slot)
-            
-            if not is_taken:
-                time_parts = time_slot.split(':')
-                medicine_time = current_time.replace(
-                    hour=int(time_parts[0]), 
-                    minute=int(time_parts[1]), 
-                    second=0, 
-                    microsecond=0
-                )
-                
-                if medicine_time > current_time:
-                    time_diff = (medicine_time - current_time).total_seconds() / 60
-                    upcoming.append({
-                        'medicine': medicine,
-                        'time': time_slot,
-                        'minutes_until': int(time_diff)
-                    })
-    
-    return sorted(upcoming, key=lambda x: x['minutes_until'])
-
-def get_all_tracking_records(user_id):
-    """Get all tracking records for a user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT t.* FROM tracking t
-        JOIN medicines m ON t.medicine_id = m.id
-        WHERE m.user_id = ?
-    """, (user_id,))
-    
-    records = cursor.fetchall()
-    conn.close()
-    
-    return records
-
-def clear_tracking_for_medicines(user_id):
-    """Clear all tracking records for user's medicines"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        DELETE FROM tracking
-        WHERE medicine_id IN (SELECT id FROM medicines WHERE user_id = ?)
-    """, (user_id,))
-    
-    conn.commit()
-    conn.close()
-
-def export_user_data(user_id):
-    """Export user data as JSON"""
-    user = get_user_by_id(user_id)
-    medicines = get_user_medicines(user_id)
-    
-    tracking_records = get_all_tracking_records(user_id)
-    
-    data = {
-        'user': {
-            'name': user[1],
-            'email': user[2],
-            'age': user[4],
-            'conditions': user[5],
-            'phone': user[6],
-            'email_address': user[7]
-        },
-        'medicines': [
-            {
-                'id': m[0],
-                'name': m[2],
-                'dosage': m[3],
-                'med_type': m[4],
-                'times': m[5],
-                'time_labels': m[6],
-                'notes': m[7],
-                'start_date': m[8],
-                'end_date': m[9],
-                'paused': m[10],
-                'color': m[11]
-            }
-            for m in medicines
-        ],
-        'tracking': [
-            {
-                'id': t['id'],
-                'medicine_id': t['medicine_id'],
-                'date': t['date'],
-                'time_slot': t['time_slot'],
-                'taken': t['taken'],
-                'timestamp': t['timestamp']
-            }
-            for t in tracking_records
-        ]
-    }
-    return json.dumps(data, indent=2)
-
-def delete_user_account(user_id):
-    """Delete user account and all associated data"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    
-    cursor.execute("DELETE FROM tracking WHERE medicine_id IN (SELECT id FROM medicines WHERE user_id=?)", (user_id,))
-    
-    
-    cursor.execute("DELETE FROM medicines WHERE user_id=?", (user_id,))
-    
-  
-    cursor.execute("DELETE FROM settings WHERE user_id=?", (user_id,))
-    
-
-    cursor.execute("DELETE FROM users WHERE id=?", (user_id,))
-    
-    conn.commit()
-    conn.close()
-
-
-def get_mascot_path(emotion):
-    """Get mascot image path with fallback"""
-    
-    emotion_file_map = {
-        'happy': 'waving pill',
-        'sad': 'sad pill',
-        'urgent': 'Angry pill',
-        'sleepy': 'Doubt pill'
-    }
-    
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    possible_paths = [
-        f'DR.pills/mascots/{emotion_file_map[emotion]}.png',
-        f'mascots/{emotion_file_map[emotion]}.png',
-        f'dr.pill/mascots/{emotion_file_map[emotion]}.png',
-    ]
-    
-    for path in possible_paths:
-        abs_path = os.path.join(script_dir, path)
-        if os.path.exists(abs_path):
-            return abs_path
-    
-    return None
+def get_mascot_uri(emotion):
+    """Get the mascot image as a data URI, or None to fall back to emoji"""
+    return load_mascots().get(emotion)
 
 def get_mascot_css_class(emotion):
     """Get CSS class for mascot animation"""
@@ -870,14 +347,14 @@ def get_mascot_css_class(emotion):
 def render_pill_mascot(emotion, message, missed_list=None):
     """Render mascot with emoji fallback"""
     
-    img_path = get_mascot_path(emotion)
+    img_uri = get_mascot_uri(emotion)
     css_class = get_mascot_css_class(emotion)
     
-    if img_path and os.path.exists(img_path):
+    if img_uri:
         st.markdown(f"""
         <div class="mascot-container">
             <div class="{css_class}">
-                <img src="file://{img_path}" style="width:160px; border-radius: 10px;">
+                <img src="{img_uri}" style="width:{MASCOT_WIDTH}px; border-radius: 10px;">
             </div>
             <h2 style="color: #9c27b0; margin-top: 1rem;">{message}</h2>
         </div>
@@ -911,25 +388,6 @@ def render_pill_mascot(emotion, message, missed_list=None):
             """, unsafe_allow_html=True)
 
 
-def get_medicine_status(medicine, time_slot, current_time, user_id):
-    """Get medicine status"""
-    today = datetime.now().strftime('%Y-%m-%d')
-    settings = get_settings(user_id)
-    
-    if get_intake_status(medicine['id'], today, time_slot):
-        return 'taken'
-    
-    current_minutes = current_time.hour * 60 + current_time.minute
-    time_parts = time_slot.split(':')
-    medicine_minutes = int(time_parts[0]) * 60 + int(time_parts[1])
-    
-    if current_minutes > medicine_minutes:
-        return 'missed'
-    elif current_minutes >= medicine_minutes - settings['reminder_advance_minutes']:
-        return 'upcoming'
-    
-    return 'scheduled'
-
 
 if "auth_mode" not in st.session_state:
     st.session_state.auth_mode = None
@@ -960,6 +418,11 @@ if "view_day_details" not in st.session_state:
 if "selected_date" not in st.session_state:
     st.session_state.selected_date = None
 
+if st.session_state.user is None:
+    rerun_profile = start_rerun_profile(st.session_state.auth_mode or "login")
+else:
+    rerun_profile = start_rerun_profile(st.session_state.page)
+
 
 st.markdown(
     "<h2 style='text-align:center;color:#9b59b6;'>Dr.Pill – Your health journey begins here 🌸</h2>",
@@ -1042,24 +505,86 @@ elif st.session_state.user and st.session_state.page == "home":
     time_str = current_time.strftime("%I:%M %p")
     today_str = today_date.strftime("%Y-%m-%d")
     
-    stats = get_adherence_stats(user_id)
     today_medicines = get_medicines_for_date(user_id, today_str)
+    today_status = get_intake_status_map(user_id, today_str)
     settings = get_settings(user_id)
     
     
-    col1, col2, col3 = st.columns([2, 1, 1])
+    # Fragments: a dose toggle reruns only its card, these counters and the sidebar
+    @st.fragment(key="home_metrics")
+    def home_metrics(user_id):
+        stats = get_adherence_stats(user_id)
+        settings = get_settings(user_id)
+        upcoming = get_upcoming_reminders(user_id)
+        upcoming_count = len([r for r in upcoming if r['minutes_until'] <= settings['reminder_advance_minutes']])
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown(f"<h1 style='text-align: center; font-size: 4rem;'>{stats['today_adherence']}%</h1>", unsafe_allow_html=True)
+            st.markdown("<p style='text-align: center;'>Today's Progress</p>", unsafe_allow_html=True)
+        with col2:
+            st.markdown(f"<h1 style='text-align: center; font-size: 4rem;'>{upcoming_count}</h1>", unsafe_allow_html=True)
+            st.markdown("<p style='text-align: center;'>⏰ Upcoming</p>", unsafe_allow_html=True)
+    
+    def toggle_dose(medicine_id, target_date, time_slot, card_key):
+        toggle_intake(medicine_id, target_date, time_slot)
+        st.rerun([card_key, "home_metrics", "adherence_banner", "sidebar"])
+    
+    def render_dose_card(medicine, slot, target_date, user_id, card_key):
+        time_slot = slot.time
+        status_map = get_intake_status_map(user_id, target_date)
+        status = get_medicine_status(medicine, slot, datetime.now(), user_id, status_map)
+        
+        status_colors = {
+            'taken': ('✅', 'card-taken'),
+            'missed': ('❌', 'card-missed'),
+            'upcoming': ('⏰', 'card-upcoming'),
+            'scheduled': ('📋', 'card-scheduled')
+        }
+        
+        emoji, card_class = status_colors[status]
+        time_label = slot.label
+        
+        is_taken = status_map.get((medicine.id, target_date, time_slot))
+        
+        col1, col2 = st.columns([8, 2])
+        
+        with col1:
+            notes_html = f"<p>📝 {medicine.notes}</p>" if medicine.notes else ''
+            st.markdown(f"""
+            <div class="medicine-card {card_class}">
+                <h3>{emoji} {medicine.name}</h3>
+                <p>💊 {medicine.dosage} • 🕐 {time_slot} • {time_label}</p>
+                {notes_html}
+            </div>
+            """, unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown("<br>", unsafe_allow_html=True)
+            st.button("✓ Taken" if not is_taken else "↶ Undo", 
+                      key=f"toggle_{medicine.id}_{time_slot}",
+                      on_click=toggle_dose, args=(medicine.id, target_date, time_slot, card_key),
+                      use_container_width=True)
+    
+    @st.fragment(key="adherence_banner")
+    def adherence_banner(user_id):
+        if get_adherence_stats(user_id)['today_adherence'] >= 80:
+            st.markdown("""
+            <div style="background: linear-gradient(135deg, #fff9c4 0%, #ffcc80 100%); 
+                        border-radius: 30px; padding: 2rem; text-align: center; 
+                        border: 4px solid #ffd54f; margin-top: 2rem;">
+                <h2>🏆 Amazing Work! 🎉</h2>
+                <p style="font-size: 1.5rem;">You're doing fantastic! Keep it up! 💪✨</p>
+            </div>
+            """, unsafe_allow_html=True)
+    
+    col1, col2 = st.columns([2, 2])
     with col1:
         st.markdown(f"# Hi {user[1]}! 👋")
         st.markdown(f"### {date_str}")
         st.markdown(f"#### 🕐 {time_str}")
     with col2:
-        st.markdown(f"<h1 style='text-align: center; font-size: 4rem;'>{stats['today_adherence']}%</h1>", unsafe_allow_html=True)
-        st.markdown("<p style='text-align: center;'>Today's Progress</p>", unsafe_allow_html=True)
-    with col3:
-        upcoming = get_upcoming_reminders(user_id)
-        upcoming_count = len([r for r in upcoming if r['minutes_until'] <= settings['reminder_advance_minutes']])
-        st.markdown(f"<h1 style='text-align: center; font-size: 4rem;'>{upcoming_count}</h1>", unsafe_allow_html=True)
-        st.markdown("<p style='text-align: center;'>⏰ Upcoming</p>", unsafe_allow_html=True)
+        home_metrics(user_id)
     
     st.markdown("---")
     
@@ -1075,15 +600,15 @@ elif st.session_state.user and st.session_state.page == "home":
         missed_medicines = []
         
         for medicine in today_medicines:
-            for time_slot in medicine['times']:
+            for slot in medicine.slots:
                 total_scheduled += 1
-                status = get_medicine_status(medicine, time_slot, current_time, user_id)
+                status = get_medicine_status(medicine, slot, current_time, user_id, today_status)
                 
                 if status == 'taken':
                     taken_count += 1
                 elif status == 'missed':
                     missed_count += 1
-                    missed_medicines.append({'name': medicine['name'], 'time': time_slot})
+                    missed_medicines.append({'name': medicine.name, 'time': slot.time})
                 elif status == 'upcoming':
                     upcoming_count += 1
         
@@ -1150,8 +675,8 @@ elif st.session_state.user and st.session_state.page == "home":
                     
                     st.markdown(f"""
                     <div class="medicine-card card-upcoming">
-                        <h3>⏰ {reminder['medicine']['name']}</h3>
-                        <p>💊 {reminder['medicine']['dosage']} • 🕐 {reminder['time']}</p>
+                        <h3>⏰ {reminder['medicine'].name}</h3>
+                        <p>💊 {reminder['medicine'].dosage} • 🕐 {reminder['time']}</p>
                         <p>📍 In {time_text}</p>
                     </div>
                     """, unsafe_allow_html=True)
@@ -1167,51 +692,11 @@ elif st.session_state.user and st.session_state.page == "home":
             st.rerun()
     else:
         for medicine in today_medicines:
-            for idx, time_slot in enumerate(medicine['times']):
-                status = get_medicine_status(medicine, time_slot, current_time, user_id)
-                
-                status_colors = {
-                    'taken': ('✅', 'card-taken'),
-                    'missed': ('❌', 'card-missed'),
-                    'upcoming': ('⏰', 'card-upcoming'),
-                    'scheduled': ('📋', 'card-scheduled')
-                }
-                
-                emoji, card_class = status_colors[status]
-                time_label = medicine['time_labels'][idx] if idx < len(medicine['time_labels']) else ''
-                
-                is_taken = get_intake_status(medicine['id'], today_str, time_slot)
-                
-                col1, col2 = st.columns([8, 2])
-                
-                with col1:
-                    notes_html = f"<p>📝 {medicine['notes']}</p>" if medicine['notes'] else ''
-                    st.markdown(f"""
-                    <div class="medicine-card {card_class}">
-                        <h3>{emoji} {medicine['name']}</h3>
-                        <p>💊 {medicine['dosage']} • 🕐 {time_slot} • {time_label}</p>
-                        {notes_html}
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                with col2:
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    if st.button("✓ Taken" if not is_taken else "↶ Undo", 
-                               key=f"toggle_{medicine['id']}_{time_slot}",
-                               use_container_width=True):
-                        toggle_intake(medicine['id'], today_str, time_slot)
-                        st.rerun()
-    
+            for slot in medicine.slots:
+                card_key = f"dose_{medicine.id}_{slot.time}"
+                st.fragment(render_dose_card, key=card_key)(medicine, slot, today_str, user_id, card_key)
     
-    if stats['today_adherence'] >= 80:
-        st.markdown("""
-        <div style="background: linear-gradient(135deg, #fff9c4 0%, #ffcc80 100%); 
-                    border-radius: 30px; padding: 2rem; text-align: center; 
-                    border: 4px solid #ffd54f; margin-top: 2rem;">
-            <h2>🏆 Amazing Work! 🎉</h2>
-            <p style="font-size: 1.5rem;">You're doing fantastic! Keep it up! 💪✨</p>
-        </div>
-        """, unsafe_allow_html=True)
+    adherence_banner(user_id)
 
 
 elif st.session_state.user and st.session_state.page == "profile":
@@ -1355,20 +840,21 @@ elif st.session_state.user and st.session_state.page == "medicines_list":
     
    
     medicines = get_user_medicines(user_id)
+    taken_counts = get_taken_counts(user_id)
     filtered_meds = medicines
     
     if filter_type == "Daily (Ongoing)":
-        filtered_meds = [m for m in filtered_meds if m[4] == 'Daily (Ongoing)']
+        filtered_meds = [m for m in filtered_meds if m.med_type == 'Daily (Ongoing)']
     elif filter_type == "Date Range":
-        filtered_meds = [m for m in filtered_meds if m[4] == 'Date Range']
+        filtered_meds = [m for m in filtered_meds if m.med_type == 'Date Range']
     
     if filter_status == "Active":
-        filtered_meds = [m for m in filtered_meds if not m[10]]
+        filtered_meds = [m for m in filtered_meds if not m.paused]
     elif filter_status == "Paused":
-        filtered_meds = [m for m in filtered_meds if m[10]]
+        filtered_meds = [m for m in filtered_meds if m.paused]
     
     if search:
-        filtered_meds = [m for m in filtered_meds if search.lower() in m[2].lower()]
+        filtered_meds = [m for m in filtered_meds if search.lower() in m.name.lower()]
     
     st.markdown(f"**Showing {len(filtered_meds)} medicine(s)**")
     st.markdown("---")
@@ -1380,16 +866,15 @@ elif st.session_state.user and st.session_state.page == "medicines_list":
             st.rerun()
     else:
         for med in filtered_meds:
-            med_id, user_id_val, name, dosage, med_type, times_str, time_labels_str, notes, start_date, end_date, paused, color = med
+            med_id, name, dosage, med_type = med.id, med.name, med.dosage, med.med_type
+            notes, start_date, end_date, paused, color = med.notes, med.start_date, med.end_date, med.paused, med.color
             
             status_text = "⏸️ Paused" if paused else "✅ Active"
             type_text = f"📅 {med_type}"
             if med_type == "Date Range":
                 type_text = f"📆 {start_date} to {end_date}"
             
-            time_slots = [t.strip() for t in times_str.split(",") if t.strip()]
-            time_labels_list = [l.strip() for l in time_labels_str.split(",") if l.strip()] if time_labels_str else [""] * len(time_slots)
-            times_display = ", ".join([f"{t} ({l})" for t, l in zip(time_slots, time_labels_list)])
+            times_display = ", ".join([f"{slot.time} ({slot.label})" for slot in med.slots])
             
             with st.expander(f"💊 {name} - {status_text}", expanded=False):
                 col1, col2 = st.columns([2, 1])
@@ -1404,7 +889,7 @@ elif st.session_state.user and st.session_state.page == "medicines_list":
                 
                 with col2:
                 
-                    total_intakes = get_total_taken_count(med_id)
+                    total_intakes = taken_counts.get(med_id, 0)
                     st.metric("Total Taken", total_intakes)
                 
                
@@ -1431,10 +916,11 @@ elif st.session_state.user and st.session_state.page == "medicines_list":
     
    
     if st.session_state.edit_medicine_id:
-        med = get_medicine_by_id(st.session_state.edit_medicine_id)
+        med = next((m for m in medicines if m.id == st.session_state.edit_medicine_id), None)
         
         if med:
-            med_id, user_id_val, name, dosage, med_type, times_str, time_labels_str, notes, start_date, end_date, paused, color = med
+            med_id, name, dosage, med_type = med.id, med.name, med.dosage, med.med_type
+            notes, start_date, end_date, color = med.notes, med.start_date, med.end_date, med.color
             
             st.markdown("---")
             st.markdown(f"## ✏️ Editing: {name}")
@@ -1465,12 +951,12 @@ elif st.session_state.user and st.session_state.page == "medicines_list":
                                                     value=datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else date.today() + timedelta(days=7))
                 
                 st.markdown("### ⏰ Times")
-                num_times = st.number_input("How many times per day?", min_value=1, max_value=10, value=len(times_str.split(",")))
+                existing_times = med.times
+                existing_labels = med.time_labels
+                num_times = st.number_input("How many times per day?", min_value=1, max_value=10, value=max(len(med.slots), 1))
                 
                 new_times = []
                 new_time_labels = []
-                existing_times = [t.strip() for t in times_str.split(",") if t.strip()]
-                existing_labels = [l.strip() for l in time_labels_str.split(",") if l.strip()] if time_labels_str else []
                 
                 cols = st.columns(2)
                 for i in range(int(num_times)):
@@ -1516,6 +1002,9 @@ elif st.session_state.user and st.session_state.page == "medicines_list":
 
 
 elif st.session_state.user and st.session_state.page == "calendar":
+    # Only the calendar draws charts, so plotly is imported here rather than at startup
+    import plotly.graph_objects as go
+    
     user = st.session_state.user
     user_id = user[0]
     year = st.session_state.cal_year
@@ -1576,6 +1065,7 @@ elif st.session_state.user and st.session_state.page == "calendar":
 
     # Calendar grid
     cal = calendar.monthcalendar(year, month)
+    month_days = get_month_calendar(user_id, year, month)
 
     for week in cal:
         cols = st.columns(7)
@@ -1584,7 +1074,8 @@ elif st.session_state.user and st.session_state.page == "calendar":
                 cols[i].markdown(" ")
             else:
                 target_date = f"{year:04d}-{month:02d}-{day_num:02d}"
-                adherence = calculate_adherence(user_id, target_date)
+                day_info = month_days[target_date]
+                adherence = adherence_percent(day_info['scheduled'], day_info['taken'])
                 
                 # Determine color based on adherence
                 if adherence >= 100:
@@ -1614,7 +1105,7 @@ elif st.session_state.user and st.session_state.page == "calendar":
                 today_class = "today" if is_today else ""
                 
                 
-                day_meds = get_medicines_for_date(user_id, target_date)
+                day_meds = day_info['medicines']
                 
                
                 date_obj = date(year, month, day_num)
@@ -1634,11 +1125,11 @@ elif st.session_state.user and st.session_state.page == "calendar":
                 if day_meds:
                     med_list_html = "<div class='medicine-list'>"
                     for med in day_meds:
-                        med_list_html += f"<div class='medicine-item'>💊 {med['name']}</div>"
+                        med_list_html += f"<div class='medicine-item'>💊 {med.name}</div>"
                     med_list_html += "</div>"
                 
                
-                total_doses = sum(len(med['times']) for med in day_meds) if day_meds else 0
+                total_doses = sum(len(med.slots) for med in day_meds) if day_meds else 0
                 
                 cols[i].markdown(
                     f"""
@@ -1698,32 +1189,24 @@ elif st.session_state.user and st.session_state.page == "calendar":
         
         selected_date = st.session_state.selected_date
         day_meds = get_medicines_for_date(user_id, selected_date)
+        day_records = get_intake_records(user_id, selected_date)
         
         if day_meds:
             total = 0
             taken = 0
             
             for med in day_meds:
-                for time_slot in med['times']:
+                for time_slot in med.times:
                     total += 1
                     
-                    # Check if taken using SQLite
-                    is_taken = get_intake_status(med['id'], selected_date, time_slot)
+                    record = day_records.get((med.id, selected_date, time_slot))
+                    is_taken = bool(record and record.taken)
                     taken_at = None
                     
                     if is_taken:
                         taken += 1
-                        # Get timestamp from database
-                        conn = get_db_connection()
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "SELECT timestamp FROM tracking WHERE medicine_id=? AND date=? AND time_slot=?",
-                            (med['id'], selected_date, time_slot)
-                        )
-                        result = cursor.fetchone()
-                        conn.close()
-                        if result and result['timestamp']:
-                            taken_at = datetime.fromisoformat(result['timestamp']).strftime('%I:%M %p')
+                        if record.timestamp:
+                            taken_at = datetime.fromisoformat(record.timestamp).strftime('%I:%M %p')
                     
                     status = "✅ Taken" if is_taken else "⭕ Not Taken"
                     bg_color = "#d4edda" if is_taken else "#f8d7da"
@@ -1732,8 +1215,8 @@ elif st.session_state.user and st.session_state.page == "calendar":
                     
                     st.markdown(f"""
                     <div style="background:{bg_color};border-radius:15px;padding:1rem;margin:0.5rem 0;border:3px solid {border_color};">
-                        <h3>{status} - {med['name']}</h3>
-                        <p>💊 {med['dosage']} • ⏰ {time_slot}</p>
+                        <h3>{status} - {med.name}</h3>
+                        <p>💊 {med.dosage} • ⏰ {time_slot}</p>
                         {taken_time_html}
                     </div>
                     """, unsafe_allow_html=True)
@@ -1789,6 +1272,47 @@ elif st.session_state.user and st.session_state.page == "calendar":
     )
     
     st.plotly_chart(fig, use_container_width=True)
+    
+    
+    st.markdown("---")
+    st.markdown("## 📈 Long-Range Report")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        report_days = st.selectbox("Window", [30, 90, 180, 365], index=3, format_func=lambda d: f"Last {d} days")
+    with col2:
+        report_period = st.radio("Group by", ["Daily", "Weekly", "Monthly"], index=1, horizontal=True)
+    
+    report_start = (today_date - timedelta(days=report_days - 1)).strftime('%Y-%m-%d')
+    report = get_adherence_report(user_id, report_start, today_date.strftime('%Y-%m-%d'))
+    report_frame = report[report_period.lower()]
+    
+    report_fig = go.Figure(data=[
+        go.Bar(
+            x=report_frame.index,
+            y=report_frame['adherence'],
+            marker_color=['#81c784' if v >= 80 else '#ffd54f' if v >= 50 else '#e57373' for v in report_frame['adherence']]
+        )
+    ])
+    report_fig.update_layout(
+        title=f"{report_period} Adherence - Last {report_days} Days",
+        xaxis_title="Date",
+        yaxis_title="Adherence %",
+        yaxis_range=[0, 105],
+        height=400,
+        showlegend=False
+    )
+    st.plotly_chart(report_fig, use_container_width=True)
+    
+    total_scheduled = int(report_frame['scheduled'].sum())
+    total_taken = int(report_frame['taken'].sum())
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Doses Scheduled", total_scheduled)
+    with col2:
+        st.metric("Doses Taken", total_taken)
+    with col3:
+        st.metric("Overall Adherence", f"{int(total_taken / total_scheduled * 100) if total_scheduled else 0}%")
 
 
 elif st.session_state.user and st.session_state.page == "settings":
@@ -1806,8 +1330,9 @@ elif st.session_state.user and st.session_state.page == "settings":
     col1, col2 = st.columns(2)
     with col1:
         reminders_enabled = st.toggle("Enable Reminders", value=settings['reminders_enabled'])
-        update_settings(user_id, reminders_enabled, settings['reminder_advance_minutes'])
-        settings = get_settings(user_id)
+        if reminders_enabled != bool(settings['reminders_enabled']):
+            update_settings(user_id, reminders_enabled, settings['reminder_advance_minutes'])
+            settings = get_settings(user_id)
     
     with col2:
         advance_minutes = st.number_input(
@@ -1817,8 +1342,9 @@ elif st.session_state.user and st.session_state.page == "settings":
             value=settings['reminder_advance_minutes'],
             step=5
         )
-        update_settings(user_id, settings['reminders_enabled'], advance_minutes)
-        settings = get_settings(user_id)
+        if advance_minutes != settings['reminder_advance_minutes']:
+            update_settings(user_id, settings['reminders_enabled'], advance_minutes)
+            settings = get_settings(user_id)
     
     if settings['reminders_enabled']:
         st.success(f"✅ You'll be reminded {settings['reminder_advance_minutes']} minutes before each medicine time")
@@ -1832,7 +1358,7 @@ elif st.session_state.user and st.session_state.page == "settings":
     
     stats = get_adherence_stats(user_id)
     tracking_records = get_all_tracking_records(user_id)
-    total_intakes = sum(1 for t in tracking_records if t['taken'])
+    total_intakes = sum(1 for t in tracking_records if t.taken)
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -1840,11 +1366,11 @@ elif st.session_state.user and st.session_state.page == "settings":
         st.metric("Total Medicines Taken", total_intakes)
     
     with col2:
-        total_daily = len([m for m in get_user_medicines(user_id) if m[4] == 'Daily (Ongoing)'])
+        total_daily = len([m for m in get_user_medicines(user_id) if m.med_type == 'Daily (Ongoing)'])
         st.metric("Daily Medicines", total_daily)
     
     with col3:
-        total_date_range = len([m for m in get_user_medicines(user_id) if m[4] == 'Date Range'])
+        total_date_range = len([m for m in get_user_medicines(user_id) if m.med_type == 'Date Range'])
         st.metric("Date Range Medicines", total_date_range)
     
     with col4:
@@ -1877,16 +1403,65 @@ elif st.session_state.user and st.session_state.page == "settings":
     
     with col1:
         st.markdown("### Export Data")
-        if st.button("📥 Download Backup (JSON)", use_container_width=True):
-            json_data = export_user_data(user_id)
+        export_format = st.radio("Backup format", ["JSON", "NDJSON"], horizontal=True)
+        if st.button(f"📥 Download Backup ({export_format})", use_container_width=True):
+            extension = export_format.lower()
             st.download_button(
                 label="💾 Download",
-                data=json_data,
-                file_name=f"dr_pill_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                mime="application/json",
+                data=export_user_bytes(user_id, extension),
+                file_name=f"dr_pill_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                mime="application/x-ndjson" if extension == "ndjson" else "application/json",
                 use_container_width=True
             )
             st.success("✅ Backup ready for download!")
+        
+        st.markdown("### Analytics Export")
+        export_table = st.selectbox("Table", list(EXPORT_TABLES), format_func=lambda name: name.replace('_', ' ').title())
+        columnar_format = st.radio("File format", ["CSV", "Parquet"] if PARQUET_AVAILABLE else ["CSV"], horizontal=True)
+        export_start = export_end = None
+        if st.checkbox("Only export a date range"):
+            export_start = st.date_input("From", value=date.today() - timedelta(days=30)).strftime('%Y-%m-%d')
+            export_end = st.date_input("To", value=date.today()).strftime('%Y-%m-%d')
+        if st.button(f"📊 Export {columnar_format}", use_container_width=True):
+            extension = columnar_format.lower()
+            export_file = io.BytesIO()
+            exported_rows = write_table_export(user_id, export_table, extension, export_file, export_start, export_end)
+            st.download_button(
+                label=f"💾 Download ({exported_rows} rows)",
+                data=export_file.getvalue(),
+                file_name=f"dr_pill_{export_table}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                mime="text/csv" if extension == "csv" else "application/vnd.apache.parquet",
+                use_container_width=True
+            )
+        
+        st.markdown("### Restore Data")
+        backup_files = st.file_uploader(
+            "Backup files (JSON, NDJSON, or medicines and tracking CSV/Parquet)",
+            type=["json", "ndjson", "csv", "parquet"],
+            accept_multiple_files=True
+        )
+        if backup_files and st.button("♻️ Restore Backup", use_container_width=True):
+            backup = {'medicines': [], 'tracking': []}
+            try:
+                for backup_file in backup_files:
+                    parsed = read_backup_file(backup_file.name, backup_file.getvalue())
+                    backup['medicines'] += parsed['medicines']
+                    backup['tracking'] += parsed['tracking']
+            except (ValueError, KeyError) as exc:
+                st.error(f"❌ Could not read backup: {exc}")
+            else:
+                report = import_user_data(user_id, backup)
+                st.success(
+                    f"✅ Restored {report['medicines_added']} new medicine(s) "
+                    f"({report['medicines_matched']} already here, {report['medicines_skipped']} with invalid times skipped) and "
+                    f"{report['tracking_added']} intake record(s) "
+                    f"({report['tracking_updated']} updated, {report['tracking_unchanged']} unchanged, "
+                    f"{report['tracking_skipped']} skipped)"
+                )
+        
+        if st.button("🔄 Rebuild Adherence Data", use_container_width=True):
+            rebuilt_days = rebuild_daily_adherence(user_id)
+            st.success(f"✅ Recalculated adherence for {rebuilt_days} days!")
     
     with col2:
         st.markdown("### Danger Zone")
@@ -2075,13 +1650,15 @@ elif st.session_state.user and st.session_state.page == "shop":
 
 
 
-if st.session_state.user:
-    st.sidebar.markdown("# 💊 Dr.Pill")
-    st.sidebar.markdown("---")
+@st.fragment(key="sidebar")
+def render_sidebar(user_id):
+    """Navigation, quick stats and log out; reruns on its own after a dose toggle"""
+    st.markdown("# 💊 Dr.Pill")
+    st.markdown("---")
     
    
-    settings = get_settings(st.session_state.user[0])
-    upcoming = get_upcoming_reminders(st.session_state.user[0])
+    settings = get_settings(user_id)
+    upcoming = get_upcoming_reminders(user_id)
     urgent_count = len([r for r in upcoming if r['minutes_until'] <= settings['reminder_advance_minutes']])
     
     pages = {
@@ -2100,26 +1677,70 @@ if st.session_state.user:
         if page == 'home' and urgent_count > 0 and settings['reminders_enabled']:
             display_label = f"{label} 🔴"
         
-        if st.sidebar.button(display_label, use_container_width=True, 
-                            type="primary" if st.session_state.page == page else "secondary"):
+        if st.button(display_label, use_container_width=True, 
+                     type="primary" if st.session_state.page == page else "secondary"):
             st.session_state.page = page
             st.rerun()
     
-    st.sidebar.markdown("---")
-    st.sidebar.markdown("💕 Taking care of you, one reminder at a time!")
+    st.markdown("---")
+    st.markdown("💕 Taking care of you, one reminder at a time!")
     
     
-    stats = get_adherence_stats(st.session_state.user[0])
-    st.sidebar.markdown("### 📊 Quick Stats")
-    st.sidebar.progress(stats['today_adherence'] / 100)
-    st.sidebar.markdown(f"Today's Adherence: **{stats['today_adherence']}%**")
-    st.sidebar.markdown(f"Active Medicines: **{stats['active_medicines']}/{stats['total_medicines']}**")
+    stats = get_adherence_stats(user_id)
+    st.markdown("### 📊 Quick Stats")
+    st.progress(stats['today_adherence'] / 100)
+    st.markdown(f"Today's Adherence: **{stats['today_adherence']}%**")
+    st.markdown(f"Active Medicines: **{stats['active_medicines']}/{stats['total_medicines']}**")
     
-    if st.sidebar.button("🚪 Log Out", use_container_width=True):
+    if st.button("🚪 Log Out", use_container_width=True):
         st.session_state.user = None
         st.session_state.auth_mode = None
         st.session_state.page = "home"
         st.rerun()
 
+
+if st.session_state.user:
+    with st.sidebar:
+        render_sidebar(st.session_state.user[0])
+
 st.markdown("---")
 
+rerun_summary = finish_rerun_profile(rerun_profile)
+
+# Process-wide SQL and per-page stats across sessions: operators only, never a URL switch
+if os.environ.get("DRPILL_DEBUG") == "1":
+    import pandas as pd
+    
+    with st.sidebar.expander("🔧 Query Profile", expanded=bool(rerun_summary['n_plus_one'])):
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Queries", rerun_summary['queries'])
+        c2.metric("SQL ms", rerun_summary['sql_ms'])
+        c3.metric("Wall ms", rerun_summary['wall_ms'])
+        st.caption(f"Page: {rerun_summary['page']} · Rows: {rerun_summary['rows']}")
+        
+        for flag in rerun_summary['n_plus_one']:
+            if 'sql' in flag:
+                st.warning(f"Possible N+1: ran {flag['count']}× `{flag['sql'][:120]}`")
+            else:
+                st.warning(f"Possible N+1: {flag['function']}() called {flag['count']}× with {flag['queries']} queries")
+        
+        if rerun_profile.queries:
+            st.markdown("**Slowest statements**")
+            st.dataframe(pd.DataFrame(
+                [
+                    {'sql': sql, 'count': count, 'ms': round(seconds * 1000, 2), 'rows': rows}
+                    for sql, (count, seconds, rows) in rerun_profile.queries.items()
+                ]
+            ).sort_values('ms', ascending=False).head(10), hide_index=True)
+        
+        if rerun_profile.calls:
+            st.markdown("**Data calls**")
+            st.dataframe(pd.DataFrame(
+                [
+                    {'function': name, 'count': count, 'ms': round(seconds * 1000, 2), 'queries': queries}
+                    for name, (count, seconds, queries) in rerun_profile.calls.items()
+                ]
+            ).sort_values('ms', ascending=False), hide_index=True)
+        
+        st.markdown("**Per page averages**")
+        st.dataframe(pd.DataFrame.from_dict(get_profile_stats().page_averages(), orient='index'))
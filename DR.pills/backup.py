@@ -0,0 +1,177 @@
+"""Hot backups of drpill.db while the app is running.
+
+Copies the live database with SQLite's online backup API a few pages at a
+time, so sessions keep reading and writing during the copy. Snapshots are
+timestamped; --compact writes them with VACUUM INTO instead, and --every
+keeps taking them on a schedule. Like the app, --db defaults to drpill.db
+in the current directory, so run it from where the app is started.
+
+Usage:
+    python backup.py --dest backups
+    python backup.py --dest backups --compact --every 3600 --keep 24
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from urllib.request import pathname2url
+
+from drpill.db import DB_PATH
+
+SNAPSHOT_PREFIX = "drpill-"
+SNAPSHOT_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+logger = logging.getLogger("drpill.backup")
+
+
+class BackupRestarted(Exception):
+    """The source kept changing under a stepped backup"""
+
+
+def snapshot_path(dest_dir, now=None):
+    """Timestamped snapshot file name inside dest_dir"""
+    stamp = (now or datetime.now()).strftime(SNAPSHOT_FORMAT)
+    return os.path.join(dest_dir, f"{SNAPSHOT_PREFIX}{stamp}.db")
+
+
+def open_source(db_path):
+    """Open the live database read-only, failing instead of creating an empty one"""
+    if not os.path.isfile(db_path):
+        raise FileNotFoundError(f"No database at {os.path.abspath(db_path)}")
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True)
+
+
+def copy_online(source, destination, pages, pause, max_restarts):
+    """Copy source into destination a few pages per step
+
+    SQLite restarts a stepped backup whenever another connection writes to
+    the source. If that happens more than max_restarts times the copy is
+    finished in one step, which under WAL still does not block writers.
+    """
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > max_restarts:
+                raise BackupRestarted()
+        state['remaining'] = remaining
+        if pause:
+            time.sleep(pause)
+
+    try:
+        source.backup(destination, pages=pages, progress=progress)
+    except BackupRestarted:
+        logger.info("Source changed %s times during backup, copying in one step", state['restarts'])
+        source.backup(destination)
+
+
+def backup_database(db_path=DB_PATH, dest_dir="backups", pages=256, pause=0.005, compact=False, max_restarts=3):
+    """Write a consistent snapshot of db_path into dest_dir and return its path
+
+    The online backup copies `pages` pages per step and sleeps `pause` seconds
+    between steps so writers are never blocked for long. With compact=True the
+    snapshot is written with VACUUM INTO, which also defragments it.
+    """
+    source = open_source(db_path)
+    try:
+        os.makedirs(dest_dir, exist_ok=True)
+        target = snapshot_path(dest_dir)
+        partial = target + ".part"
+        if os.path.exists(partial):
+            os.remove(partial)
+
+        if compact:
+            source.execute("VACUUM INTO ?", (partial,))
+        else:
+            destination = sqlite3.connect(partial)
+            try:
+                copy_online(source, destination, pages, pause, max_restarts)
+            finally:
+                destination.close()
+    finally:
+        source.close()
+
+    check = sqlite3.connect(partial)
+    try:
+        result = check.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        check.close()
+    if result != "ok":
+        os.remove(partial)
+        raise sqlite3.DatabaseError(f"Snapshot failed quick_check: {result}")
+
+    # Never overwrite an earlier snapshot
+    if os.path.exists(target):
+        os.remove(partial)
+        raise FileExistsError(f"Snapshot {target} already exists")
+    os.replace(partial, target)
+    return target
+
+
+def list_snapshots(dest_dir):
+    """Snapshot paths in dest_dir, oldest first"""
+    if not os.path.isdir(dest_dir):
+        return []
+    names = sorted(
+        name for name in os.listdir(dest_dir)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(".db")
+    )
+    return [os.path.join(dest_dir, name) for name in names]
+
+
+def prune_snapshots(dest_dir, keep):
+    """Delete all but the newest `keep` snapshots and return the deleted paths"""
+    snapshots = list_snapshots(dest_dir)
+    stale = snapshots[:-keep] if keep > 0 else []
+    for path in stale:
+        os.remove(path)
+    return stale
+
+
+def run_schedule(every, keep=None, **backup_options):
+    """Take a snapshot every `every` seconds until interrupted"""
+    while True:
+        started = time.monotonic()
+        try:
+            path = backup_database(**backup_options)
+            logger.info("Snapshot written to %s", path)
+            if keep:
+                for stale in prune_snapshots(backup_options.get("dest_dir", "backups"), keep):
+                    logger.info("Removed old snapshot %s", stale)
+        except (sqlite3.Error, OSError):
+            logger.exception("Snapshot failed")
+        time.sleep(max(0, every - (time.monotonic() - started)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DB_PATH, help="database to back up")
+    parser.add_argument("--dest", default="backups", help="directory for snapshots")
+    parser.add_argument("--pages", type=int, default=256, help="pages copied per backup step")
+    parser.add_argument("--pause", type=float, default=0.005, help="seconds to sleep between steps")
+    parser.add_argument("--compact", action="store_true", help="write snapshots with VACUUM INTO")
+    parser.add_argument("--every", type=float, help="keep taking a snapshot every N seconds")
+    parser.add_argument("--keep", type=int, help="only keep the newest N snapshots")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    options = dict(db_path=args.db, dest_dir=args.dest, pages=args.pages, pause=args.pause, compact=args.compact)
+    if args.every:
+        try:
+            run_schedule(args.every, args.keep, **options)
+        except KeyboardInterrupt:
+            return 0
+
+    path = backup_database(**options)
+    print(path)
+    if args.keep:
+        prune_snapshots(args.dest, args.keep)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""Benchmarks for the Dr.Pill data functions.
+
+generate.py fills a drpill.db with a synthetic population and run.py times
+the data functions against it, writing the timings to JSON so runs from
+different commits can be compared:
+
+    python -m benchmarks.generate --dir /tmp/drpill-bench --users 500 --years 2
+    python -m benchmarks.run --dir /tmp/drpill-bench --output before.json
+    python -m benchmarks.run --dir /tmp/drpill-bench --compare before.json
+
+startup.py times the UI script's imports and each page's first paint in
+fresh processes:
+
+    python -m benchmarks.startup --dir /tmp/drpill-bench --output startup.json
+"""
+import os
+
+from drpill.db import DB_PATH, init_database
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def open_database(workdir):
+    """Use the drpill.db in workdir, creating its schema if needed"""
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    init_database(DB_PATH)
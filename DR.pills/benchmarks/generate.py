@@ -0,0 +1,141 @@
+"""Fill a drpill.db with a synthetic population for benchmarking.
+
+Every user gets the same number of medicines and dose slots per medicine,
+so timings scale with --users and --years alone. Most medicines are daily,
+some run over a date range and a few are paused; each scheduled dose of the
+history is taken with probability --adherence.
+
+Usage:
+    python -m benchmarks.generate --dir /tmp/drpill-bench --users 500 --medicines 6 --slots 3 --years 2
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+from benchmarks import open_database
+from drpill.adherence import rebuild_daily_adherence
+
+COLORS = ["#9c27b0", "#e91e63", "#3f51b5", "#009688", "#ff9800", "#795548"]
+SLOT_LABELS = ["Morning", "Noon", "Afternoon", "Evening", "Night"]
+
+
+def slot_times(slots):
+    """`slots` dose times spread evenly between 08:00 and 20:00"""
+    if slots == 1:
+        return ["08:00"]
+    step = 12 * 60 // (slots - 1)
+    return [f"{(8 * 60 + n * step) // 60:02d}:{(8 * 60 + n * step) % 60:02d}" for n in range(slots)]
+
+
+def medicine_plan(rnd, history, medicines, slots):
+    """(med_type, start_date, end_date, paused, times, labels) for one user's medicines"""
+    times = slot_times(slots)
+    labels = [SLOT_LABELS[n % len(SLOT_LABELS)] for n in range(slots)]
+    plan = []
+    for n in range(medicines):
+        roll = rnd.random()
+        if roll < 0.2:
+            start = history[rnd.randrange(len(history))]
+            end = min(start + timedelta(days=rnd.randrange(7, 90)), history[-1])
+            plan.append(('Date Range', start.isoformat(), end.isoformat(), False, times, labels))
+        else:
+            plan.append(('Daily (Ongoing)', '', '', roll > 0.95, times, labels))
+    return plan
+
+
+def tracking_rows(rnd, med_id, med_type, start_date, end_date, times, history, adherence):
+    """Tracking rows for one medicine: taken doses plus a few toggled back off"""
+    for day in history:
+        target_date = day.isoformat()
+        if med_type == 'Date Range' and not start_date <= target_date <= end_date:
+            continue
+        for slot_time in times:
+            roll = rnd.random()
+            if roll < adherence:
+                yield (med_id, target_date, slot_time, 1, f"{target_date} {slot_time}:00")
+            elif roll < adherence + 0.02:
+                yield (med_id, target_date, slot_time, 0, None)
+
+
+def generate(db_path, users, medicines, slots, years, adherence, seed):
+    """Insert the synthetic population into db_path and return row counts"""
+    rnd = random.Random(seed)
+    today = date.today()
+    history = [today - timedelta(days=n) for n in range(int(years * 365) - 1, -1, -1)]
+    counts = {'users': 0, 'medicines': 0, 'medicine_slots': 0, 'tracking': 0}
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    cursor = conn.cursor()
+    first_user = (cursor.execute("SELECT MAX(id) FROM users").fetchone()[0] or 0) + 1
+    for n in range(first_user, first_user + users):
+        cursor.execute(
+            "INSERT INTO users (name, email, password, age, conditions, phone, email_address) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (f"Bench {n}", f"bench{n}@example.com", "pw", rnd.randrange(18, 90), "", "", f"bench{n}@example.com")
+        )
+        user_id = cursor.lastrowid
+        cursor.execute(
+            "INSERT INTO settings (user_id, reminders_enabled, reminder_advance_minutes) VALUES (?, 1, 30)",
+            (user_id,)
+        )
+        counts['users'] += 1
+
+        for m, (med_type, start_date, end_date, paused, times, labels) in enumerate(medicine_plan(rnd, history, medicines, slots)):
+            cursor.execute(
+                "INSERT INTO medicines (user_id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, paused, color) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, f"Medicine {m}", "1 tablet", med_type, ", ".join(times), ", ".join(labels), "",
+                 start_date, end_date, paused, COLORS[m % len(COLORS)])
+            )
+            med_id = cursor.lastrowid
+            cursor.executemany(
+                "INSERT INTO medicine_slots (medicine_id, position, slot_time, label) VALUES (?, ?, ?, ?)",
+                [(med_id, position, slot_time, label) for position, (slot_time, label) in enumerate(zip(times, labels))]
+            )
+            counts['medicines'] += 1
+            counts['medicine_slots'] += len(times)
+
+            if not paused:
+                cursor.executemany(
+                    "INSERT INTO tracking (medicine_id, date, time_slot, taken, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    tracking_rows(rnd, med_id, med_type, start_date, end_date, times, history, adherence)
+                )
+                counts['tracking'] += cursor.rowcount
+        conn.commit()
+
+    conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", required=True, help="directory for drpill.db")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--medicines", type=int, default=5, help="medicines per user")
+    parser.add_argument("--slots", type=int, default=3, help="dose slots per medicine")
+    parser.add_argument("--years", type=float, default=1, help="years of tracking history")
+    parser.add_argument("--adherence", type=float, default=0.85, help="share of doses taken")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-rollup", action="store_true", help="leave daily_adherence to be filled lazily")
+    args = parser.parse_args()
+
+    db_path = os.path.join(os.path.abspath(args.dir), "drpill.db")
+    if os.path.exists(db_path):
+        parser.error(f"{db_path} already exists")
+
+    open_database(os.path.abspath(args.dir))
+    started = time.perf_counter()
+    counts = generate(db_path, args.users, args.medicines, args.slots, args.years, args.adherence, args.seed)
+    if not args.no_rollup:
+        counts['daily_adherence'] = rebuild_daily_adherence()
+    elapsed = time.perf_counter() - started
+
+    print(", ".join(f"{count} {table}" for table, count in counts.items()) + f" in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Time the Dr.Pill data functions against a generated drpill.db.
+
+Each benchmark runs `cold`, with the user's cached results dropped before
+every call, and `warm`, served from the result cache the way a Streamlit
+rerun usually is. Timings are written as JSON; --compare prints the change
+against an earlier results file.
+
+The benchmarks run on a throwaway copy of the generated database, so the
+toggle_intake writes never change the data later runs are measured on.
+
+Usage:
+    python -m benchmarks.run --dir /tmp/drpill-bench --output results.json
+    python -m benchmarks.run --dir /tmp/drpill-bench --compare results.json
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import date, datetime, timedelta
+
+from benchmarks import APP_DIR, open_database
+from drpill.db import DB_PATH
+from drpill.adherence import calculate_adherence, get_adherence_stats, get_month_calendar
+from drpill.cache import invalidate_user_cache
+from drpill.db import get_db_connection
+from drpill.exports import export_user_data
+from drpill.medicines import get_medicines_for_date, get_user_medicines
+from drpill.scheduling import get_reminder_scheduler, get_upcoming_reminders
+from drpill.tracking import toggle_intake
+from drpill.users import get_user_ids
+
+
+def benchmarks(user_id, medicine):
+    """name -> (function, warm) for every timed call; warm=False skips the cached run"""
+    today = date.today()
+    target_date = today.strftime('%Y-%m-%d')
+    rnd = random.Random(user_id)
+
+    def toggle():
+        day = (today - timedelta(days=rnd.randrange(30))).strftime('%Y-%m-%d')
+        toggle_intake(medicine.id, day, rnd.choice(medicine.times))
+
+    return {
+        'get_adherence_stats': (lambda: get_adherence_stats(user_id), True),
+        'calculate_adherence': (lambda: calculate_adherence(user_id, target_date), True),
+        'get_medicines_for_date': (lambda: get_medicines_for_date(user_id, target_date), True),
+        'get_upcoming_reminders': (lambda: get_upcoming_reminders(user_id), True),
+        'get_month_calendar': (lambda: get_month_calendar(user_id, today.year, today.month), True),
+        'export_user_data': (lambda: export_user_data(user_id), False),
+        'toggle_intake': (toggle, False),
+    }
+
+
+def summarize(timings):
+    """Milliseconds statistics for one list of per-call timings in seconds"""
+    ms = sorted(t * 1000 for t in timings)
+    return {
+        'runs': len(ms),
+        'min': round(ms[0], 4),
+        'median': round(statistics.median(ms), 4),
+        'mean': round(statistics.fmean(ms), 4),
+        'p95': round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 4),
+        'max': round(ms[-1], 4),
+    }
+
+
+def time_call(func, repeat, setup=None):
+    """Time `repeat` single calls, running setup (untimed) before each"""
+    timer = timeit.Timer(func, setup=setup or "pass")
+    return timer.repeat(repeat=repeat, number=1)
+
+
+def copy_database(source_dir):
+    """Copy source_dir/drpill.db into a temporary directory removed at exit"""
+    workdir = tempfile.mkdtemp(prefix="drpill-bench-run-")
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    source = sqlite3.connect(f"file:{os.path.join(source_dir, DB_PATH)}?mode=ro", uri=True)
+    destination = sqlite3.connect(os.path.join(workdir, DB_PATH))
+    source.backup(destination)
+    destination.close()
+    source.close()
+    return workdir
+
+
+def stop_scheduler(timeout=120):
+    """Let the reminder scheduler load every user, then stop its thread
+
+    Cache invalidation wakes the scheduler, which would otherwise refresh
+    the benchmarked user on its own thread while the cold runs are timed.
+    get_upcoming_reminders still works: it refreshes on the calling thread.
+    """
+    scheduler = get_reminder_scheduler()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with scheduler.lock:
+            if not scheduler.dirty and not scheduler.reload_all:
+                break
+        time.sleep(0.05)
+    scheduler.stop()
+
+
+def database_counts():
+    conn = get_db_connection()
+    counts = {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ('users', 'medicines', 'tracking', 'daily_adherence')
+    }
+    conn.close()
+    return counts
+
+
+def git_commit(directory=APP_DIR):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=directory
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(user_id, repeat, only=None):
+    """Run every benchmark for one user and return {name: {mode: stats}}"""
+    medicine = next(med for med in get_user_medicines(user_id) if med.slots)
+    results = {}
+    for name, (func, warm) in benchmarks(user_id, medicine).items():
+        if only and name not in only:
+            continue
+        func()
+        cold = time_call(func, repeat, setup=lambda: invalidate_user_cache(user_id, medicines=True))
+        results[name] = {'cold': summarize(cold)}
+        if warm:
+            results[name]['warm'] = summarize(time_call(func, repeat))
+    return results
+
+
+def compare(results, baseline):
+    """Print median changes against an earlier results file"""
+    for name, modes in results['benchmarks'].items():
+        for mode, stats in modes.items():
+            before = baseline['benchmarks'].get(name, {}).get(mode)
+            if not before:
+                continue
+            change = (stats['median'] - before['median']) / before['median'] * 100 if before['median'] else 0
+            print(f"{name:26} {mode:5} {before['median']:10.3f} -> {stats['median']:10.3f} ms  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", required=True, help="directory holding a generated drpill.db")
+    parser.add_argument("--user", type=int, help="user to benchmark (default: the first one)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed calls per benchmark and mode")
+    parser.add_argument("--only", nargs="*", help="benchmark names to run")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    args = parser.parse_args()
+    output = args.output and os.path.abspath(args.output)
+    baseline = args.compare and os.path.abspath(args.compare)
+
+    source_dir = os.path.abspath(args.dir)
+    if not os.path.isfile(os.path.join(source_dir, DB_PATH)):
+        parser.error(f"no {DB_PATH} in {source_dir}; create one with benchmarks.generate")
+    open_database(copy_database(source_dir))
+    user_id = args.user or min(get_user_ids())
+    stop_scheduler()
+
+    results = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'user_id': user_id,
+        'repeat': args.repeat,
+        'database': database_counts(),
+        'benchmarks': run(user_id, args.repeat, args.only),
+    }
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    if baseline:
+        with open(baseline) as f:
+            compare(results, json.load(f))
+    else:
+        for name, modes in results['benchmarks'].items():
+            print(f"{name:26} " + "  ".join(f"{mode} {stats['median']:.3f} ms" for mode, stats in modes.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
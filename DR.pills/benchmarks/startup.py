@@ -0,0 +1,178 @@
+"""Time Dr.Pill start-up: the UI script's imports and each page's first paint.
+
+Every sample runs in a fresh Python process with streamlit already
+imported, so it measures what a new server process pays for DR.PILLS.py
+itself. `imports` executes only the script's top-level import statements.
+A page's `first` run is its first AppTest run against a fresh copy of a
+generated drpill.db, and `rerun` is the run straight after it.
+--importtime lists the modules those imports spend the most time in,
+from python -X importtime. --app times another checkout's DR.pills
+directory, such as a git worktree of an older commit, for before/after
+comparisons.
+
+Usage:
+    python -m benchmarks.generate --dir /tmp/drpill-startup --users 3 --years 0.2
+    python -m benchmarks.startup --dir /tmp/drpill-startup --output startup.json
+    python -m benchmarks.startup --dir /tmp/drpill-startup --compare startup.json
+    python -m benchmarks.startup --dir /tmp/drpill-startup --app /tmp/old/DR.pills --output before.json
+    python -m benchmarks.startup --importtime
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+from benchmarks import APP_DIR
+from benchmarks.run import compare, git_commit, summarize
+from drpill.db import DB_PATH
+
+APP_SCRIPT = "DR.PILLS.py"
+PAGES = ["login", "home", "calendar", "settings"]
+IMPORTTIME_MARKER = "drpill-startup: app imports"
+
+# Runs the top-level imports of DR.PILLS.py and prints the seconds they took
+IMPORTS_CODE = """
+import ast, sys, time
+sys.path.insert(0, {app_dir!r})
+import streamlit
+with open({script!r}, encoding="utf-8") as f:
+    tree = ast.parse(f.read())
+imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+code = compile(ast.Module(body=imports, type_ignores=[]), "imports", "exec")
+sys.stderr.write({marker!r} + "\\n")
+started = time.perf_counter()
+exec(code, {{}})
+print(time.perf_counter() - started)
+"""
+
+# Runs one page twice with AppTest and prints both times in seconds
+PAINT_CODE = """
+import logging, sqlite3, sys, time
+logging.disable(logging.CRITICAL)
+sys.path.insert(0, {app_dir!r})
+from streamlit.testing.v1 import AppTest
+page = sys.argv[1]
+at = AppTest.from_file({script!r}, default_timeout=120)
+if page != "login":
+    conn = sqlite3.connect({db_path!r})
+    at.session_state["user"] = conn.execute(
+        "SELECT id, name, email, password, age, conditions, phone, email_address FROM users ORDER BY id LIMIT 1"
+    ).fetchone()
+    conn.close()
+    at.session_state["page"] = page
+started = time.perf_counter()
+at.run()
+first = time.perf_counter() - started
+if at.exception:
+    sys.exit(at.exception[0].value)
+started = time.perf_counter()
+at.run()
+print(first, time.perf_counter() - started)
+"""
+
+
+def run_python(code, *args, cwd=None, options=()):
+    """Run code in a fresh interpreter and return (stdout, stderr)"""
+    result = subprocess.run(
+        [sys.executable, *options, "-c", code, *args], capture_output=True, text=True, cwd=cwd
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return result.stdout, result.stderr
+
+
+def time_imports(app_dir, runs):
+    """Seconds spent in DR.PILLS.py's imports, one sample per fresh process"""
+    code = IMPORTS_CODE.format(app_dir=app_dir, script=os.path.join(app_dir, APP_SCRIPT), marker=IMPORTTIME_MARKER)
+    return [float(run_python(code)[0]) for _ in range(runs)]
+
+
+def time_page(app_dir, source_dir, page, runs):
+    """(first, rerun) seconds of one page, each sample on a fresh database copy"""
+    first, rerun = [], []
+    for _ in range(runs):
+        workdir = tempfile.mkdtemp(prefix="drpill-startup-")
+        try:
+            shutil.copy(os.path.join(source_dir, DB_PATH), workdir)
+            code = PAINT_CODE.format(
+                app_dir=app_dir, script=os.path.join(app_dir, APP_SCRIPT), db_path=os.path.join(workdir, DB_PATH)
+            )
+            first_run, second_run = map(float, run_python(code, page, cwd=workdir)[0].split())
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        first.append(first_run)
+        rerun.append(second_run)
+    return first, rerun
+
+
+def slowest_imports(app_dir, limit):
+    """(cumulative ms, module) of the slowest modules DR.PILLS.py imports, from -X importtime"""
+    code = IMPORTS_CODE.format(app_dir=app_dir, script=os.path.join(app_dir, APP_SCRIPT), marker=IMPORTTIME_MARKER)
+    _, stderr = run_python(code, options=("-X", "importtime"))
+    modules = []
+    for line in stderr.split(IMPORTTIME_MARKER, 1)[1].splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented; keep the modules the script imports itself
+        name = name[1:]
+        if not name.startswith(" "):
+            modules.append((int(cumulative) / 1000, name))
+    return sorted(modules, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dir", help="directory holding a generated drpill.db (needed for page timings)")
+    parser.add_argument("--app", default=APP_DIR, help="DR.pills directory to time (default: this checkout)")
+    parser.add_argument("--runs", type=int, default=9, help="fresh processes per measurement")
+    parser.add_argument("--pages", nargs="*", default=PAGES, help="pages to time")
+    parser.add_argument("--importtime", action="store_true", help="list the slowest modules the UI imports")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    args = parser.parse_args()
+    app_dir = os.path.abspath(args.app)
+
+    if args.importtime:
+        for ms, name in slowest_imports(app_dir, 15):
+            print(f"{ms:10.1f} ms  {name}")
+        return 0
+
+    if not args.dir:
+        parser.error("--dir is required unless --importtime is given")
+    source_dir = os.path.abspath(args.dir)
+    if not os.path.isfile(os.path.join(source_dir, DB_PATH)):
+        parser.error(f"no {DB_PATH} in {source_dir}; create one with benchmarks.generate")
+
+    timings = {'imports': {'first': summarize(time_imports(app_dir, args.runs))}}
+    for page in args.pages:
+        first, rerun = time_page(app_dir, source_dir, page, args.runs)
+        timings[page] = {'first': summarize(first), 'rerun': summarize(rerun)}
+
+    results = {
+        'commit': git_commit(app_dir),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'runs': args.runs,
+        'benchmarks': timings,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    else:
+        for name, modes in timings.items():
+            print(f"{name:26} " + "  ".join(f"{mode} {stats['median']:.1f} ms" for mode, stats in modes.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""Dr.Pill data layer: SQLite storage, adherence, reminders and exports.
+
+Nothing here imports Streamlit, so workers, schedulers and benchmarks can
+use it directly; DR.PILLS.py is the UI on top of it.
+"""
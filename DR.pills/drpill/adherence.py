@@ -0,0 +1,296 @@
+"""Daily adherence: the rollup table and the statistics built on it."""
+import calendar
+from datetime import date, datetime, timedelta
+
+from drpill.cache import cached_per_user, invalidate_user_cache
+from drpill.db import get_db_connection, serialized_write
+from drpill.medicines import get_schedule_index, get_user_medicines
+from drpill.profiling import profiled
+from drpill.tracking import get_intake_status_map
+
+
+def get_date_range(start_date, end_date):
+    """List every 'YYYY-MM-DD' date from start_date to end_date inclusive"""
+    day = datetime.strptime(start_date, '%Y-%m-%d').date()
+    last_day = datetime.strptime(end_date, '%Y-%m-%d').date()
+    dates = []
+    while day <= last_day:
+        dates.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=1)
+    return dates
+
+
+@profiled
+def get_daily_adherence(user_id, start_date, end_date):
+    """Count scheduled and taken doses for every day in a range in one pass"""
+    schedule = get_schedule_index(user_id)
+    status_map = get_intake_status_map(user_id, start_date, end_date)
+    
+    daily = {}
+    for target_date in get_date_range(start_date, end_date):
+        scheduled = 0
+        taken = 0
+        for med in schedule.medicines_on(target_date):
+            for time_slot in med.times:
+                scheduled += 1
+                if status_map.get((med.id, target_date, time_slot)):
+                    taken += 1
+        daily[target_date] = (scheduled, taken)
+    
+    return daily
+
+
+@cached_per_user
+def get_adherence_rollup(user_id, start_date, end_date):
+    """Read per-day scheduled/taken counts from daily_adherence, filling gaps"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "SELECT date, scheduled, taken FROM daily_adherence WHERE user_id=? AND date BETWEEN ? AND ?",
+        (user_id, start_date, end_date)
+    )
+    daily = {row['date']: (row['scheduled'], row['taken']) for row in cursor.fetchall()}
+    
+    conn.close()
+    
+    dates = get_date_range(start_date, end_date)
+    missing = [d for d in dates if d not in daily]
+    today = date.today().strftime('%Y-%m-%d')
+    # Days after today are not stored; future schedules can still change
+    if missing and missing[0] <= today:
+        daily.update(fill_daily_adherence(user_id, missing[0], min(missing[-1], today)))
+    missing = [d for d in dates if d not in daily]
+    if missing:
+        daily.update(get_daily_adherence(user_id, missing[0], missing[-1]))
+    
+    return {d: daily[d] for d in dates}
+
+
+@serialized_write
+def fill_daily_adherence(user_id, start_date, end_date):
+    """Compute and insert the daily_adherence rows still missing in a range
+
+    The gap is re-read, counted and stored in one writer call, so a toggle
+    can never commit between counting a day and inserting its row.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "SELECT date, scheduled, taken FROM daily_adherence WHERE user_id=? AND date BETWEEN ? AND ?",
+        (user_id, start_date, end_date)
+    )
+    daily = {row['date']: (row['scheduled'], row['taken']) for row in cursor.fetchall()}
+    missing = [d for d in get_date_range(start_date, end_date) if d not in daily]
+    if missing:
+        computed = get_daily_adherence(user_id, missing[0], missing[-1])
+        rows = [(user_id, d) + computed[d] for d in missing]
+        cursor.executemany(
+            "INSERT INTO daily_adherence (user_id, date, scheduled, taken) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+        for d in missing:
+            daily[d] = computed[d]
+    
+    conn.close()
+    return daily
+
+
+def get_history_start(cursor, user_id):
+    """First date a user has tracking or a medicine start date (today if neither)"""
+    cursor.execute("""
+        SELECT MIN(t.date) AS first_date FROM tracking t
+        JOIN medicines m ON t.medicine_id = m.id
+        WHERE m.user_id = ?
+    """, (user_id,))
+    first_tracked = cursor.fetchone()['first_date']
+    cursor.execute("SELECT MIN(start_date) AS first_date FROM medicines WHERE user_id=?", (user_id,))
+    first_start = cursor.fetchone()['first_date']
+    today = date.today().strftime('%Y-%m-%d')
+    return min(d for d in (first_tracked, first_start, today) if d)
+
+
+@serialized_write
+def rebuild_daily_adherence(user_id=None):
+    """Recompute the daily_adherence rollup from medicines and tracking (backfill)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    if user_id is None:
+        cursor.execute("SELECT id FROM users")
+        user_ids = [row['id'] for row in cursor.fetchall()]
+        cursor.execute("DELETE FROM daily_adherence")
+    else:
+        user_ids = [user_id]
+        cursor.execute("DELETE FROM daily_adherence WHERE user_id=?", (user_id,))
+    
+    today = date.today().strftime('%Y-%m-%d')
+    total_rows = 0
+    for uid in user_ids:
+        start_date = get_history_start(cursor, uid)
+        daily = get_daily_adherence(uid, start_date, today)
+        cursor.executemany(
+            "INSERT INTO daily_adherence (user_id, date, scheduled, taken) VALUES (?, ?, ?, ?)",
+            [(uid, d) + counts for d, counts in daily.items()]
+        )
+        total_rows += len(daily)
+    
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id)
+    return total_rows
+
+
+def adherence_percent(scheduled, taken):
+    """Adherence percentage for one day (100 when nothing is scheduled)"""
+    if scheduled == 0:
+        return 100
+    return int((taken / scheduled) * 100)
+
+
+@profiled
+def calculate_adherence(user_id, target_date):
+    """Calculate adherence percentage"""
+    scheduled, taken = get_adherence_rollup(user_id, target_date, target_date)[target_date]
+    return adherence_percent(scheduled, taken)
+
+
+@profiled
+def calculate_weekly_adherence(user_id):
+    """Calculate weekly adherence"""
+    d = date.today()
+    start_date = (d - timedelta(days=6)).strftime('%Y-%m-%d')
+    daily = get_adherence_rollup(user_id, start_date, d.strftime('%Y-%m-%d'))
+    
+    weekly_data = {}
+    for target_date, (scheduled, taken) in daily.items():
+        day_name = datetime.strptime(target_date, '%Y-%m-%d').strftime('%a')
+        weekly_data[day_name] = adherence_percent(scheduled, taken)
+    
+    return weekly_data
+
+
+@cached_per_user
+def get_month_calendar(user_id, year, month):
+    """Per-day scheduled/taken counts and scheduled medicines for a whole month"""
+    start_date = f"{year:04d}-{month:02d}-01"
+    end_date = f"{year:04d}-{month:02d}-{calendar.monthrange(year, month)[1]:02d}"
+    daily = get_adherence_rollup(user_id, start_date, end_date)
+    schedule = get_schedule_index(user_id)
+    
+    month_days = {}
+    for target_date, (scheduled, taken) in daily.items():
+        month_days[target_date] = {
+            'scheduled': scheduled,
+            'taken': taken,
+            'medicines': list(schedule.medicines_on(target_date))
+        }
+    
+    return month_days
+
+
+def add_adherence_column(frame):
+    """Add an adherence % column to a frame of scheduled/taken counts"""
+    rate = frame['taken'] / frame['scheduled'].where(frame['scheduled'] > 0) * 100
+    frame['adherence'] = rate.fillna(100).astype(int)
+    return frame
+
+
+@profiled
+def get_adherence_frame(user_id, start_date, end_date):
+    """Daily scheduled/taken counts for any date window, computed with pandas"""
+    import pandas as pd
+    
+    conn = get_db_connection()
+    slots = pd.read_sql_query("""
+        SELECT m.id, m.med_type, m.start_date, m.end_date, m.paused, s.slot_time AS time_slot
+        FROM medicines m
+        JOIN medicine_slots s ON s.medicine_id = m.id
+        WHERE m.user_id = ?
+        ORDER BY m.id, s.position
+    """, conn, params=(user_id,))
+    tracking = pd.read_sql_query("""
+        SELECT t.medicine_id, t.date, t.time_slot, t.taken FROM tracking t
+        JOIN medicines m ON t.medicine_id = m.id
+        WHERE m.user_id = ? AND t.date BETWEEN ? AND ?
+        ORDER BY t.id
+    """, conn, params=(user_id, start_date, end_date))
+    conn.close()
+    
+    # One row per (medicine, time slot)
+    slots = slots[~slots['paused'].fillna(0).astype(bool)]
+    
+    # Date x slot grid, keeping only the days each medicine is scheduled
+    dates = pd.date_range(start_date, end_date).strftime('%Y-%m-%d')
+    grid = pd.DataFrame({'date': dates}).merge(slots, how='cross')
+    in_range = (
+        (grid['start_date'].fillna('') != '') & (grid['end_date'].fillna('') != '')
+        & (grid['start_date'] <= grid['date']) & (grid['date'] <= grid['end_date'])
+    )
+    grid = grid[(grid['med_type'] == 'Daily (Ongoing)') | ((grid['med_type'] == 'Date Range') & in_range)]
+    
+    tracking = tracking.drop_duplicates(['medicine_id', 'date', 'time_slot'])
+    grid = grid.merge(
+        tracking, how='left',
+        left_on=['id', 'date', 'time_slot'], right_on=['medicine_id', 'date', 'time_slot']
+    )
+    grid['taken'] = grid['taken'].fillna(0).astype(bool).astype(int)
+    
+    daily = grid.groupby('date').agg(scheduled=('taken', 'size'), taken=('taken', 'sum'))
+    daily = daily.reindex(dates, fill_value=0)
+    daily.index = pd.to_datetime(daily.index)
+    daily.index.name = 'date'
+    return add_adherence_column(daily)
+
+
+@cached_per_user
+def get_adherence_report(user_id, start_date, end_date):
+    """Daily, weekly and monthly adherence frames for a date window"""
+    daily = get_adherence_frame(user_id, start_date, end_date)
+    report = {'daily': daily}
+    
+    for name, period in (('weekly', 'W'), ('monthly', 'M')):
+        grouped = daily[['scheduled', 'taken']].groupby(daily.index.to_period(period)).sum()
+        grouped.index = grouped.index.start_time
+        grouped.index.name = 'date'
+        report[name] = add_adherence_column(grouped)
+    
+    return report
+
+
+@cached_per_user
+def get_adherence_stats(user_id):
+    """Get adherence statistics"""
+    d = date.today()
+    today = d.strftime("%Y-%m-%d")
+    medicines = get_user_medicines(user_id)
+    total_meds = len(medicines)
+    active_meds = len([m for m in medicines if not m.paused])
+    
+    # One pass over the last 30 days covers today, the 7-day series and the 30-day rate
+    start_date = (d - timedelta(days=29)).strftime("%Y-%m-%d")
+    daily = get_adherence_rollup(user_id, start_date, today)
+    today_adherence = adherence_percent(*daily[today])
+    
+    last_7_days = []
+    for i in range(7):
+        target_date = (d - timedelta(days=i)).strftime("%Y-%m-%d")
+        last_7_days.append(adherence_percent(*daily[target_date]))
+    
+    avg_adherence = sum(last_7_days) / len(last_7_days) if last_7_days else 100
+    
+    total_scheduled_30d = sum(scheduled for scheduled, taken in daily.values())
+    total_taken_30d = sum(taken for scheduled, taken in daily.values())
+    
+    overall_adherence = int((total_taken_30d / total_scheduled_30d * 100)) if total_scheduled_30d > 0 else 0
+    
+    return {
+        'today_adherence': today_adherence,
+        'total_medicines': total_meds,
+        'active_medicines': active_meds,
+        'avg_adherence': int(avg_adherence),
+        'last_7_days': last_7_days,
+        'overall_adherence': overall_adherence
+    }
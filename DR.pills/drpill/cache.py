@@ -0,0 +1,132 @@
+"""Per-user cache of read results, invalidated by writes."""
+import functools
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from drpill.profiling import profiled
+from drpill.resources import singleton
+
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHE_MISS = object()
+# Results that depend on any of a user's data, and those that only read their medicines
+USER_DATA = 'data'
+MEDICINE_DATA = 'medicines'
+
+
+def estimate_size(value):
+    """Rough deep size in bytes of a cached result"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    elif hasattr(value, '__slots__'):
+        size += sum(estimate_size(getattr(value, name)) for name in value.__slots__)
+    return size
+
+
+class ResultCache:
+    """LRU cache of per-user read results, capped by estimated memory
+
+    Every user has a data version per scope that is part of each key. Writes
+    bump the versions of the scopes they change, so stale results are never
+    served and are dropped right away.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.generation = 0
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def version(self, user_id, scope=USER_DATA):
+        """Current data version of a user in one scope"""
+        with self.lock:
+            return (self.generation, self.versions.get((user_id, scope), 0))
+
+    def get(self, key, default=None):
+        """Cached value for key, or default"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        """Store a value, evicting least recently used entries over the cap"""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def bump(self, user_id=None, scopes=(USER_DATA,)):
+        """Invalidate one user's results in some scopes, or everyone's when user_id is None"""
+        with self.lock:
+            if user_id is None:
+                self.generation += 1
+                stale = list(self.entries)
+            else:
+                for scope in scopes:
+                    self.versions[(user_id, scope)] = self.versions.get((user_id, scope), 0) + 1
+                stale = [key for key in self.entries if key[1] == user_id and key[2] in scopes]
+            for key in stale:
+                self.size -= self.entries.pop(key)[1]
+
+
+@singleton
+def get_result_cache():
+    """Process-wide cache of per-user read results"""
+    return ResultCache()
+
+
+def cached_per_user(func, scope=USER_DATA):
+    """Decorator: serve func(user_id, ...) from the result cache until that user's data changes"""
+    @profiled
+    @functools.wraps(func)
+    def wrapper(user_id, *args):
+        cache = get_result_cache()
+        # Several reads depend on today's date, so entries also expire at midnight
+        key = (func.__name__, user_id, scope, cache.version(user_id, scope), date.today(), args)
+        value = cache.get(key, CACHE_MISS)
+        if value is CACHE_MISS:
+            value = func(user_id, *args)
+            cache.put(key, value)
+        return value
+    return wrapper
+
+
+def cached_per_user_medicines(func):
+    """Decorator: like cached_per_user, but only a change to the user's medicines invalidates it"""
+    return cached_per_user(func, MEDICINE_DATA)
+
+
+invalidation_listeners = []
+
+
+def add_invalidation_listener(listener):
+    """Also call listener(user_id) whenever a user's data changes"""
+    invalidation_listeners.append(listener)
+
+
+def invalidate_user_cache(user_id=None, medicines=False):
+    """Drop cached results after a write (everyone's when user_id is None)
+
+    Pass medicines=True when the write changed the user's medicines, so
+    results cached with cached_per_user_medicines are dropped as well.
+    """
+    get_result_cache().bump(user_id, (USER_DATA, MEDICINE_DATA) if medicines else (USER_DATA,))
+    for listener in invalidation_listeners:
+        listener(user_id)
@@ -0,0 +1,178 @@
+"""Pooled SQLite connections and the serialized write queue."""
+import atexit
+import contextvars
+import functools
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+from drpill.migrations import run_migrations
+from drpill.profiling import TracingCursor, profiled
+from drpill.resources import singleton
+
+DB_PATH = "drpill.db"
+DB_POOL_SIZE = 8
+
+# Applied to every pooled connection when it is opened
+DB_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+}
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection that goes back to its pool on close()"""
+    pool = None
+
+    def cursor(self, factory=TracingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+
+class ConnectionPool:
+    """Pool of SQLite connections reused across Streamlit reruns"""
+
+    def __init__(self, db_path, size=DB_POOL_SIZE):
+        self.db_path = db_path
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.closed = False
+        self.schema_version = None
+
+    def connect(self):
+        """Open a new connection and apply PRAGMAs once"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        for name, value in DB_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        """Hand out an idle connection, opening one if the pool is empty"""
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding uncommitted work"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self.closed:
+            sqlite3.Connection.close(conn)
+            return
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            sqlite3.Connection.close(conn)
+
+    def close_all(self):
+        """Close every idle connection (called on shutdown)"""
+        self.closed = True
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            sqlite3.Connection.close(conn)
+
+
+@singleton
+def get_connection_pool(db_path):
+    """Process-wide connection pool, created once per database path
+
+    The schema is brought up to date before the pool hands out its first
+    connection, so importing code never has to initialise the database.
+    """
+    pool = ConnectionPool(db_path)
+    atexit.register(pool.close_all)
+    conn = pool.acquire()
+    try:
+        pool.schema_version = run_migrations(conn)
+    finally:
+        conn.close()
+    return pool
+
+
+def get_db_connection():
+    """Get a pooled database connection"""
+    return get_connection_pool(DB_PATH).acquire()
+
+
+class WriteQueue:
+    """Runs database writes one at a time on a dedicated writer thread
+
+    Sessions hand their writes to the queue instead of racing each other for
+    SQLite's write lock; with WAL enabled their reads never wait on it.
+    """
+
+    def __init__(self):
+        self.tasks = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="drpill-writer", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            func, args, kwargs, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+    def execute(self, func, *args, **kwargs):
+        """Run func on the writer thread and wait for its result"""
+        if threading.current_thread() is self.thread:
+            return func(*args, **kwargs)
+        future = Future()
+        # Run in a copy of the caller's context so its rerun profile sees the write
+        context = contextvars.copy_context()
+        self.tasks.put((context.run, (func,) + args, kwargs, future))
+        return future.result()
+
+    def close(self):
+        """Finish queued writes and stop the writer thread"""
+        self.tasks.put(None)
+        self.thread.join()
+
+
+@singleton
+def get_write_queue(db_path):
+    """Process-wide write queue for a database path"""
+    write_queue = WriteQueue()
+    atexit.register(write_queue.close)
+    return write_queue
+
+
+def serialized_write(func):
+    """Decorator: send a write function through the shared write queue"""
+    @profiled
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return get_write_queue(DB_PATH).execute(func, *args, **kwargs)
+    return wrapper
+
+
+def init_database(db_path):
+    """Bring the database schema up to date and return its version (runs once per process)"""
+    return get_connection_pool(db_path).schema_version
@@ -0,0 +1,338 @@
+"""User data exports (JSON, NDJSON, CSV, Parquet) and restoring backups."""
+import io
+import json
+from datetime import date
+from importlib.util import find_spec
+
+from drpill.adherence import add_adherence_column, get_adherence_rollup, get_history_start, rebuild_daily_adherence
+from drpill.cache import invalidate_user_cache
+from drpill.db import get_db_connection, serialized_write
+from drpill.medicines import fetch_medicines, write_medicine_slots
+from drpill.models import DoseSlot, split_slots
+from drpill.profiling import profiled
+from drpill.users import get_user_by_id
+
+# pandas and pyarrow are imported by the functions that use them, not at startup
+PARQUET_AVAILABLE = find_spec("pyarrow") is not None
+EXPORT_CHUNK_ROWS = 1000
+
+
+def export_user_record(user):
+    """Backup fields of a user tuple"""
+    return {
+        'name': user[1],
+        'email': user[2],
+        'age': user[4],
+        'conditions': user[5],
+        'phone': user[6],
+        'email_address': user[7]
+    }
+
+
+def export_medicine_record(row):
+    """Backup fields of a medicines row, times and labels as stored"""
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'dosage': row['dosage'],
+        'med_type': row['med_type'],
+        'times': row['times'],
+        'time_labels': row['time_labels'],
+        'notes': row['notes'],
+        'start_date': row['start_date'],
+        'end_date': row['end_date'],
+        'paused': row['paused'],
+        'color': row['color']
+    }
+
+
+def export_tracking_record(row):
+    """Backup fields of a tracking row"""
+    return {
+        'id': row['id'],
+        'medicine_id': row['medicine_id'],
+        'date': row['date'],
+        'time_slot': row['time_slot'],
+        'taken': int(row['taken']),
+        'timestamp': row['timestamp']
+    }
+
+
+def get_medicine_rows(user_id):
+    """A user's medicines rows with the times/time_labels columns they were saved with"""
+    conn = get_db_connection()
+    rows = conn.execute("SELECT * FROM medicines WHERE user_id=? ORDER BY id", (user_id,)).fetchall()
+    conn.close()
+    return rows
+
+
+def iter_tracking_batches(user_id):
+    """Yield a user's tracking rows in batches straight from the cursor"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t.* FROM tracking t
+            JOIN medicines m ON t.medicine_id = m.id
+            WHERE m.user_id = ?
+        """, (user_id,))
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def json_array_chunks(records, indent):
+    """Yield an indent=2 JSON array piece by piece, nested `indent` spaces deep"""
+    inner = "\n" + " " * (indent + 2)
+    first = True
+    for batch in records:
+        parts = []
+        for record in batch:
+            parts.append(("[" if first else ",") + inner + json.dumps(record, indent=2).replace("\n", inner))
+            first = False
+        yield "".join(parts)
+    yield "[]" if first else "\n" + " " * indent + "]"
+
+
+def stream_user_export(user_id, fmt="json"):
+    """Yield a user's backup as JSON or NDJSON text without holding it all in memory"""
+    user = export_user_record(get_user_by_id(user_id))
+    medicines = [export_medicine_record(row) for row in get_medicine_rows(user_id)]
+    tracking = ([export_tracking_record(row) for row in rows] for rows in iter_tracking_batches(user_id))
+    
+    if fmt == "ndjson":
+        yield json.dumps({'type': 'user', **user}) + "\n"
+        yield "".join(json.dumps({'type': 'medicine', **m}) + "\n" for m in medicines)
+        for batch in tracking:
+            yield "".join(json.dumps({'type': 'tracking', **t}) + "\n" for t in batch)
+        return
+    
+    # Same layout as json.dumps(backup, indent=2)
+    yield '{\n  "user": ' + json.dumps(user, indent=2).replace("\n", "\n  ")
+    yield ',\n  "medicines": '
+    yield from json_array_chunks([medicines], 2)
+    yield ',\n  "tracking": '
+    yield from json_array_chunks(tracking, 2)
+    yield "\n}"
+
+
+@profiled
+def export_user_bytes(user_id, fmt="json"):
+    """A user's backup as UTF-8 bytes for st.download_button
+
+    st.download_button and Streamlit's media file manager hold the whole
+    download in memory, so each export still costs about its full size once.
+    Streaming only avoids the extra row lists, dicts and indented copies the
+    old json.dumps path built on top of that.
+    """
+    return b"".join(chunk.encode("utf-8") for chunk in stream_user_export(user_id, fmt))
+
+
+@profiled
+def export_user_data(user_id):
+    """Export user data as JSON"""
+    return "".join(stream_user_export(user_id))
+
+
+# Analytics exports: query, date column for filters, and column types
+EXPORT_TABLES = {
+    'tracking': (
+        """SELECT t.id, t.medicine_id, t.date, t.time_slot, t.taken, t.timestamp FROM tracking t
+           JOIN medicines m ON t.medicine_id = m.id WHERE m.user_id = ?""",
+        "t.date", "t.id",
+        {'id': 'int', 'medicine_id': 'int', 'date': 'str', 'time_slot': 'str', 'taken': 'int', 'timestamp': 'str'}
+    ),
+    'medicines': (
+        """SELECT id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, paused, color
+           FROM medicines WHERE user_id = ?""",
+        None, "id",
+        {'id': 'int', 'name': 'str', 'dosage': 'str', 'med_type': 'str', 'times': 'str', 'time_labels': 'str',
+         'notes': 'str', 'start_date': 'str', 'end_date': 'str', 'paused': 'int', 'color': 'str'}
+    ),
+    'daily_adherence': (
+        "SELECT date, scheduled, taken FROM daily_adherence WHERE user_id = ?",
+        "date", "date",
+        {'date': 'str', 'scheduled': 'int', 'taken': 'int', 'adherence': 'int'}
+    ),
+}
+EXPORT_DTYPES = {'int': 'Int64', 'str': 'object'}
+
+
+def iter_table_chunks(user_id, table, start_date=None, end_date=None):
+    """Yield one of a user's tables as typed DataFrame chunks, optionally limited to a date range"""
+    query, date_column, order_column, columns = EXPORT_TABLES[table]
+    params = [user_id]
+    if date_column and start_date:
+        query += f" AND {date_column} >= ?"
+        params.append(start_date)
+    if date_column and end_date:
+        query += f" AND {date_column} <= ?"
+        params.append(end_date)
+    
+    import pandas as pd
+    
+    conn = get_db_connection()
+    try:
+        if table == 'daily_adherence':
+            # Fill rollup gaps for the requested days before reading the table
+            get_adherence_rollup(
+                user_id,
+                start_date or get_history_start(conn.cursor(), user_id),
+                end_date or date.today().strftime('%Y-%m-%d')
+            )
+        for chunk in pd.read_sql_query(f"{query} ORDER BY {order_column}", conn, params=params, chunksize=EXPORT_CHUNK_ROWS):
+            if table == 'daily_adherence':
+                chunk = add_adherence_column(chunk)
+            yield chunk.astype({name: EXPORT_DTYPES[kind] for name, kind in columns.items()})
+    finally:
+        conn.close()
+
+
+@profiled
+def write_table_export(user_id, table, fmt, export_file, start_date=None, end_date=None):
+    """Write a user's table to export_file as CSV or Parquet chunk by chunk, returning the row count"""
+    rows = 0
+    if fmt == "csv":
+        for chunk in iter_table_chunks(user_id, table, start_date, end_date):
+            export_file.write(chunk.to_csv(index=False, header=rows == 0).encode("utf-8"))
+            rows += len(chunk)
+        if rows == 0:
+            export_file.write((",".join(EXPORT_TABLES[table][3]) + "\n").encode("utf-8"))
+        return rows
+    
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    arrow_types = {'int': pa.int64(), 'str': pa.string()}
+    schema = pa.schema([(name, arrow_types[kind]) for name, kind in EXPORT_TABLES[table][3].items()])
+    with pq.ParquetWriter(export_file, schema) as writer:
+        for chunk in iter_table_chunks(user_id, table, start_date, end_date):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    return rows
+
+
+def read_backup_file(file_name, data):
+    """Parse an exported backup (JSON, NDJSON, or a CSV/Parquet table) into medicines and tracking lists"""
+    backup = {'medicines': [], 'tracking': []}
+    extension = file_name.rsplit(".", 1)[-1].lower()
+    
+    if extension == "json":
+        exported = json.loads(data)
+        backup['medicines'] = exported.get('medicines', [])
+        backup['tracking'] = exported.get('tracking', [])
+    elif extension == "ndjson":
+        for line in data.decode("utf-8").splitlines():
+            if line.strip():
+                record = json.loads(line)
+                record_type = record.pop('type', None)
+                if record_type in ('medicine', 'tracking'):
+                    backup[record_type if record_type == 'tracking' else 'medicines'].append(record)
+    elif extension in ("csv", "parquet"):
+        import pandas as pd
+        frame = pd.read_csv(io.BytesIO(data)) if extension == "csv" else pd.read_parquet(io.BytesIO(data))
+        records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+        if 'time_slot' in frame.columns:
+            backup['tracking'] = records
+        elif 'med_type' in frame.columns:
+            backup['medicines'] = records
+    else:
+        raise ValueError(f"Unsupported backup file: {file_name}")
+    
+    return backup
+
+
+@serialized_write
+def import_user_data(user_id, backup):
+    """Restore exported medicines and tracking into a user's account
+
+    Medicines are matched to existing ones by name, dosage and type, and new
+    ones get fresh ids; tracking rows are remapped to those ids and merged so
+    an intake marked taken on either side stays taken. New medicines whose
+    times do not parse as 'HH:MM' are skipped along with their tracking.
+    Medicines and tracking are merged in one transaction; the rollup is then
+    rebuilt in a second one within the same writer call, so no other write
+    can land between them.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    report = {
+        'medicines_added': 0, 'medicines_matched': 0, 'medicines_skipped': 0,
+        'tracking_added': 0, 'tracking_updated': 0, 'tracking_unchanged': 0, 'tracking_skipped': 0,
+        'adherence_days': 0
+    }
+    
+    try:
+        existing = {
+            (m.name, m.dosage, m.med_type): m.id
+            for m in fetch_medicines(cursor, "m.user_id = ?", (user_id,))
+        }
+        id_map = {}
+        for med in backup.get('medicines', []):
+            key = (med.get('name'), med.get('dosage'), med.get('med_type'))
+            if key in existing:
+                id_map[med.get('id')] = existing[key]
+                report['medicines_matched'] += 1
+                continue
+            times = med.get('times') or ""
+            time_labels = med.get('time_labels') or ""
+            try:
+                for slot_time, label in split_slots(times, time_labels):
+                    DoseSlot.parse(slot_time, label)
+            except ValueError:
+                report['medicines_skipped'] += 1
+                continue
+            cursor.execute(
+                "INSERT INTO medicines (user_id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, paused, color) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, med.get('name'), med.get('dosage'), med.get('med_type'), times, time_labels, med.get('notes'),
+                 med.get('start_date'), med.get('end_date'), int(med.get('paused') or 0), med.get('color') or '#9c27b0')
+            )
+            existing[key] = id_map[med.get('id')] = cursor.lastrowid
+            write_medicine_slots(cursor, cursor.lastrowid, times, time_labels)
+            report['medicines_added'] += 1
+        
+        # Tracking rows can also point at medicines already in this account
+        owned = set(existing.values())
+        rows = []
+        for track in backup.get('tracking', []):
+            medicine_id = id_map.get(track.get('medicine_id'))
+            if medicine_id is None and not backup.get('medicines') and track.get('medicine_id') in owned:
+                medicine_id = track.get('medicine_id')
+            if medicine_id is None or not track.get('date') or not track.get('time_slot'):
+                report['tracking_skipped'] += 1
+                continue
+            rows.append((medicine_id, track['date'], track['time_slot'], int(track.get('taken') or 0), track.get('timestamp')))
+        
+        before = cursor.execute(
+            "SELECT COUNT(*) AS count FROM tracking WHERE medicine_id IN (SELECT id FROM medicines WHERE user_id = ?)",
+            (user_id,)
+        ).fetchone()['count']
+        cursor.executemany("""
+            INSERT INTO tracking (medicine_id, date, time_slot, taken, timestamp) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (medicine_id, date, time_slot) DO UPDATE SET
+                taken = 1,
+                timestamp = excluded.timestamp
+            WHERE excluded.taken AND NOT tracking.taken
+        """, rows)
+        changed = max(cursor.rowcount, 0)
+        after = cursor.execute(
+            "SELECT COUNT(*) AS count FROM tracking WHERE medicine_id IN (SELECT id FROM medicines WHERE user_id = ?)",
+            (user_id,)
+        ).fetchone()['count']
+        
+        report['tracking_added'] = after - before
+        report['tracking_updated'] = changed - report['tracking_added']
+        report['tracking_unchanged'] = len(rows) - changed
+        conn.commit()
+    finally:
+        conn.close()
+    
+    invalidate_user_cache(user_id, medicines=True)
+    report['adherence_days'] = rebuild_daily_adherence(user_id)
+    return report
@@ -0,0 +1,272 @@
+"""Medicines, their dose slots and the date index of when they are scheduled."""
+from bisect import bisect_right
+
+from drpill.cache import cached_per_user_medicines, invalidate_user_cache
+from drpill.db import get_db_connection, serialized_write
+from drpill.models import DoseSlot, Medicine, split_slots
+from drpill.profiling import profiled
+
+
+@serialized_write
+def save_medicine(user_id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, color):
+    """Save a new medicine"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "INSERT INTO medicines (user_id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, color) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (user_id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, color)
+    )
+    
+    med_id = cursor.lastrowid
+    write_medicine_slots(cursor, med_id, times, time_labels)
+    update_medicine_rollup(cursor, med_id, 1)
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id, medicines=True)
+    
+    return med_id
+
+
+def fetch_medicines(cursor, where, params):
+    """Load Medicine records and their dose slots with one joined query"""
+    cursor.execute(f"""
+        SELECT m.*, s.slot_time, s.label FROM medicines m
+        LEFT JOIN medicine_slots s ON s.medicine_id = m.id
+        WHERE {where}
+        ORDER BY m.id, s.position
+    """, params)
+    
+    medicines = {}
+    for row in cursor.fetchall():
+        med_row, slots = medicines.setdefault(row['id'], (row, []))
+        if row['slot_time'] is not None:
+            slots.append(DoseSlot.parse(row['slot_time'], row['label']))
+    return [Medicine.from_row(row, slots) for row, slots in medicines.values()]
+
+
+def get_medicine_owner(cursor, med_id):
+    """Get the user_id a medicine belongs to"""
+    cursor.execute("SELECT user_id FROM medicines WHERE id=?", (med_id,))
+    row = cursor.fetchone()
+    return row['user_id'] if row else None
+
+
+@cached_per_user_medicines
+def get_user_medicines(user_id):
+    """Get all medicines for a user"""
+    conn = get_db_connection()
+    medicines = fetch_medicines(conn.cursor(), "m.user_id = ?", (user_id,))
+    conn.close()
+    
+    return medicines
+
+
+@profiled
+def get_medicine_by_id(med_id):
+    """Get medicine by ID"""
+    conn = get_db_connection()
+    medicines = fetch_medicines(conn.cursor(), "m.id = ?", (med_id,))
+    conn.close()
+    
+    return medicines[0] if medicines else None
+
+
+def write_medicine_slots(cursor, med_id, times, time_labels):
+    """Replace a medicine's rows in medicine_slots"""
+    cursor.execute("DELETE FROM medicine_slots WHERE medicine_id=?", (med_id,))
+    cursor.executemany(
+        "INSERT INTO medicine_slots (medicine_id, position, slot_time, label) VALUES (?, ?, ?, ?)",
+        [(med_id, position, slot_time, label) for position, (slot_time, label) in enumerate(split_slots(times, time_labels))]
+    )
+
+
+@profiled
+def get_doses_between(target_date, start_time, end_time, user_id=None):
+    """Get doses scheduled on target_date between two 'HH:MM' times, for one user or everyone"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    # Same rule as Medicine.is_scheduled
+    query = """
+        SELECT m.id AS medicine_id, m.user_id, m.name, m.dosage, m.med_type,
+               m.start_date, m.end_date, s.slot_time, s.label
+        FROM medicine_slots s
+        JOIN medicines m ON s.medicine_id = m.id
+        WHERE s.slot_time BETWEEN ? AND ? AND NOT m.paused
+          AND (m.med_type = 'Daily (Ongoing)'
+               OR (m.med_type = 'Date Range' AND m.start_date <> '' AND m.end_date <> ''
+                   AND ? BETWEEN m.start_date AND m.end_date))
+    """
+    params = (start_time, end_time, target_date)
+    if user_id is not None:
+        query += " AND m.user_id = ?"
+        params += (user_id,)
+    cursor.execute(query + " ORDER BY s.slot_time", params)
+    doses = cursor.fetchall()
+    conn.close()
+    
+    return doses
+
+
+@serialized_write
+def update_medicine(med_id, name, dosage, med_type, times, time_labels, notes, start_date, end_date, color):
+    """Update medicine"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    user_id = get_medicine_owner(cursor, med_id)
+    update_medicine_rollup(cursor, med_id, -1)
+    cursor.execute(
+        "UPDATE medicines SET name=?, dosage=?, med_type=?, times=?, time_labels=?, notes=?, start_date=?, end_date=?, color=? WHERE id=?",
+        (name, dosage, med_type, times, time_labels, notes, start_date, end_date, color, med_id)
+    )
+    write_medicine_slots(cursor, med_id, times, time_labels)
+    update_medicine_rollup(cursor, med_id, 1)
+    
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id, medicines=True)
+
+
+@serialized_write
+def delete_medicine(med_id):
+    """Delete medicine"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    user_id = get_medicine_owner(cursor, med_id)
+    update_medicine_rollup(cursor, med_id, -1)
+    cursor.execute("DELETE FROM medicines WHERE id=?", (med_id,))
+    cursor.execute("DELETE FROM medicine_slots WHERE medicine_id=?", (med_id,))
+    cursor.execute("DELETE FROM tracking WHERE medicine_id=?", (med_id,))
+    
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id, medicines=True)
+
+
+@serialized_write
+def toggle_medicine_pause(med_id):
+    """Toggle medicine pause status"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    user_id = get_medicine_owner(cursor, med_id)
+    update_medicine_rollup(cursor, med_id, -1)
+    cursor.execute("UPDATE medicines SET paused = NOT paused WHERE id=?", (med_id,))
+    update_medicine_rollup(cursor, med_id, 1)
+    
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id, medicines=True)
+
+
+class ScheduleIndex:
+    """Interval index of which medicines are scheduled on which dates
+
+    Date Range medicines are cut at their start and end dates into
+    non-overlapping segments that each hold the medicines active on them, so
+    a date lookup is one bisect instead of a scan over every medicine.
+    """
+    __slots__ = ('boundaries', 'segments')
+
+    def __init__(self, medicines):
+        always = {}
+        changes = {}
+        for med in medicines:
+            if med.paused or not med.slots:
+                continue
+            if med.med_type == 'Daily (Ongoing)':
+                always[med.id] = med
+            elif med.med_type == 'Date Range' and med.start_date and med.end_date and med.start_date <= med.end_date:
+                # (date, 0) sorts before a lookup of (date, 0) and (date, 1) after it,
+                # so a medicine is active from its start date through its end date
+                changes.setdefault((med.start_date, 0), []).append(med)
+                changes.setdefault((med.end_date, 1), []).append(med)
+        
+        self.boundaries = sorted(changes)
+        active = dict(always)
+        self.segments = [self.ordered(active)]
+        for boundary in self.boundaries:
+            for med in changes[boundary]:
+                if boundary[1]:
+                    del active[med.id]
+                else:
+                    active[med.id] = med
+            self.segments.append(self.ordered(active))
+
+    @staticmethod
+    def ordered(active):
+        return tuple(sorted(active.values(), key=lambda med: med.id))
+
+    def medicines_on(self, target_date):
+        """Medicines scheduled on a 'YYYY-MM-DD' date"""
+        return self.segments[bisect_right(self.boundaries, (target_date, 0))]
+
+    def medicines_between(self, start_date, end_date):
+        """Medicines scheduled on at least one day from start_date to end_date"""
+        first = bisect_right(self.boundaries, (start_date, 0))
+        last = bisect_right(self.boundaries, (end_date, 0))
+        active = {}
+        for segment in self.segments[first:last + 1]:
+            for med in segment:
+                active[med.id] = med
+        return list(self.ordered(active))
+
+
+@cached_per_user_medicines
+def get_schedule_index(user_id):
+    """Schedule index of a user's medicines, rebuilt after their medicines change"""
+    return ScheduleIndex(get_user_medicines(user_id))
+
+
+@profiled
+def get_medicines_for_date(user_id, target_date):
+    """Get medicines scheduled for a specific date"""
+    return list(get_schedule_index(user_id).medicines_on(target_date))
+
+
+@profiled
+def get_medicines_between(user_id, start_date, end_date):
+    """Get medicines scheduled on any day of a date range"""
+    return get_schedule_index(user_id).medicines_between(start_date, end_date)
+
+
+def update_medicine_rollup(cursor, med_id, sign):
+    """Add (sign=1) or remove (sign=-1) one medicine's doses in daily_adherence"""
+    medicines = fetch_medicines(cursor, "m.id = ?", (med_id,))
+    if not medicines:
+        return
+    
+    med = medicines[0]
+    if med.paused or not med.slots:
+        return
+    if med.med_type == 'Daily (Ongoing)':
+        date_filter, date_params = "", ()
+    elif med.med_type == 'Date Range' and med.start_date and med.end_date:
+        date_filter, date_params = " AND date BETWEEN ? AND ?", (med.start_date, med.end_date)
+    else:
+        return
+    
+    cursor.execute(
+        "UPDATE daily_adherence SET scheduled = scheduled + ? WHERE user_id=?" + date_filter,
+        (sign * len(med.slots), med.user_id) + date_params
+    )
+    
+    cursor.execute(
+        "SELECT date, time_slot, taken FROM tracking WHERE medicine_id=?" + date_filter + " ORDER BY id",
+        (med_id,) + date_params
+    )
+    status_map = {}
+    for track in cursor.fetchall():
+        status_map.setdefault((track['date'], track['time_slot']), track['taken'])
+    
+    taken_per_day = {}
+    for (target_date, time_slot), taken in status_map.items():
+        if taken:
+            taken_per_day[target_date] = taken_per_day.get(target_date, 0) + med.times.count(time_slot)
+    cursor.executemany(
+        "UPDATE daily_adherence SET taken = taken + ? WHERE user_id=? AND date=?",
+        [(sign * count, med.user_id, target_date) for target_date, count in taken_per_day.items() if count]
+    )
@@ -0,0 +1,213 @@
+"""Schema migrations for drpill.db."""
+from datetime import datetime
+
+from drpill.models import split_slots
+
+MIGRATION_BATCH_SIZE = 5000
+
+
+def iter_id_batches(conn, table, batch_size=MIGRATION_BATCH_SIZE):
+    """Yield (low, high) rowid ranges covering a table, one batch at a time"""
+    bounds = conn.execute(f"SELECT MIN(id), MAX(id) FROM {table}").fetchone()
+    if bounds[0] is None:
+        return
+    
+    low = bounds[0] - 1
+    while low < bounds[1]:
+        yield low, low + batch_size
+        low += batch_size
+
+
+def run_in_batches(conn, table, statement, batch_size=MIGRATION_BATCH_SIZE):
+    """Run a statement over a large table in committed rowid batches
+
+    The statement must filter on "id > ? AND id <= ?". Committing after each
+    batch keeps the write lock short so live sessions are not blocked while
+    a multi-GB table is migrated.
+    """
+    for low, high in iter_id_batches(conn, table, batch_size):
+        conn.execute(statement, (low, high))
+        conn.commit()
+
+
+def migration_base_tables(conn):
+    """Create the users, medicines, tracking and settings tables"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        email TEXT UNIQUE,
+        password TEXT,
+        age INTEGER,
+        conditions TEXT,
+        phone TEXT,
+        email_address TEXT
+    )
+    """)
+    
+    
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS medicines (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        name TEXT,
+        dosage TEXT,
+        med_type TEXT,
+        times TEXT,
+        time_labels TEXT,
+        notes TEXT,
+        start_date TEXT,
+        end_date TEXT,
+        paused BOOLEAN DEFAULT 0,
+        color TEXT DEFAULT '#9c27b0',
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """)
+    
+    
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS tracking (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        medicine_id INTEGER,
+        date TEXT,
+        time_slot TEXT,
+        taken BOOLEAN DEFAULT 0,
+        timestamp DATETIME,
+        FOREIGN KEY (medicine_id) REFERENCES medicines(id)
+    )
+    """)
+    
+   
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS settings (
+        user_id INTEGER PRIMARY KEY,
+        reminders_enabled BOOLEAN DEFAULT 1,
+        reminder_advance_minutes INTEGER DEFAULT 30,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """)
+
+
+def migration_daily_adherence(conn):
+    """Create the daily_adherence rollup (rows are filled lazily)"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_adherence (
+        user_id INTEGER,
+        date TEXT,
+        scheduled INTEGER DEFAULT 0,
+        taken INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, date),
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """)
+
+
+def migration_lookup_indexes(conn):
+    """Deduplicate tracking, then index tracking slots and medicines by user"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicines_user ON medicines (user_id)")
+    
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name='idx_tracking_slot'").fetchone()
+    if exists:
+        return
+    
+    # Keep the first row of any duplicated slot before enforcing uniqueness
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tracking_slot_tmp ON tracking (medicine_id, date, time_slot)")
+    conn.commit()
+    run_in_batches(conn, "tracking", """
+        DELETE FROM tracking WHERE id > ? AND id <= ? AND EXISTS (
+            SELECT 1 FROM tracking AS first
+            WHERE first.medicine_id = tracking.medicine_id
+              AND first.date = tracking.date
+              AND first.time_slot = tracking.time_slot
+              AND first.id < tracking.id
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX idx_tracking_slot ON tracking (medicine_id, date, time_slot)")
+    conn.execute("DROP INDEX idx_tracking_slot_tmp")
+
+
+def migration_medicine_slots(conn):
+    """Move comma-joined times/time_labels into one medicine_slots row per dose"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS medicine_slots (
+        medicine_id INTEGER,
+        position INTEGER,
+        slot_time TEXT,
+        label TEXT,
+        PRIMARY KEY (medicine_id, position),
+        FOREIGN KEY (medicine_id) REFERENCES medicines(id)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicine_slots_time ON medicine_slots (slot_time)")
+    conn.commit()
+    
+    for low, high in iter_id_batches(conn, "medicines"):
+        medicines = conn.execute(
+            "SELECT id, times, time_labels FROM medicines WHERE id > ? AND id <= ?", (low, high)
+        ).fetchall()
+        conn.executemany(
+            "INSERT OR IGNORE INTO medicine_slots (medicine_id, position, slot_time, label) VALUES (?, ?, ?, ?)",
+            [
+                (med['id'], position, slot_time, label)
+                for med in medicines
+                for position, (slot_time, label) in enumerate(split_slots(med['times'], med['time_labels']))
+            ]
+        )
+        conn.commit()
+
+
+def migration_notifications(conn):
+    """Create the notifications delivery log"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        medicine_id INTEGER,
+        date TEXT,
+        time_slot TEXT,
+        channel TEXT,
+        address TEXT,
+        status TEXT,
+        attempts INTEGER DEFAULT 0,
+        error TEXT,
+        created_at DATETIME,
+        sent_at DATETIME,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications (user_id, date)")
+
+
+# Ordered, idempotent schema migrations. Append new ones; never renumber.
+MIGRATIONS = [
+    (1, "base tables", migration_base_tables),
+    (2, "daily adherence rollup", migration_daily_adherence),
+    (3, "tracking and medicines lookup indexes", migration_lookup_indexes),
+    (4, "medicine dose slots", migration_medicine_slots),
+    (5, "notifications delivery log", migration_notifications),
+]
+
+
+def run_migrations(conn):
+    """Apply every migration newer than the recorded schema version"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at DATETIME
+    )
+    """)
+    conn.commit()
+    
+    applied = {row['version'] for row in conn.execute("SELECT version FROM schema_version")}
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate(conn)
+        conn.execute(
+            "INSERT OR IGNORE INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+            (version, name, datetime.now())
+        )
+        conn.commit()
+    
+    return max(version for version, name, migrate in MIGRATIONS)
@@ -0,0 +1,90 @@
+"""Typed records returned by the Dr.Pill data functions."""
+from dataclasses import dataclass, field
+
+
+def time_to_minutes(slot_time):
+    """Convert an 'HH:MM' time to minutes since midnight"""
+    hours, minutes = slot_time.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def split_slots(times, time_labels):
+    """Parse comma-joined times/labels into [(slot_time, label), ...]"""
+    raw_times = (times or "").split(",")
+    raw_labels = (time_labels or "").split(",")
+    
+    slots = []
+    for position, slot_time in enumerate(raw_times):
+        if slot_time.strip():
+            label = raw_labels[position].strip() if position < len(raw_labels) else ""
+            slots.append((slot_time.strip(), label))
+    return slots
+
+
+@dataclass(frozen=True, slots=True)
+class DoseSlot:
+    """One daily dose time of a medicine"""
+    time: str
+    label: str
+    minutes: int
+
+    @classmethod
+    def parse(cls, slot_time, label=""):
+        return cls(slot_time, label or "", time_to_minutes(slot_time))
+
+
+@dataclass(slots=True)
+class Medicine:
+    """A medicine with its dose slots already parsed"""
+    id: int
+    user_id: int
+    name: str
+    dosage: str
+    med_type: str
+    notes: str
+    start_date: str
+    end_date: str
+    paused: bool
+    color: str
+    slots: tuple = ()
+    times: tuple = field(init=False)
+    time_labels: tuple = field(init=False)
+
+    def __post_init__(self):
+        self.slots = tuple(self.slots)
+        self.times = tuple(slot.time for slot in self.slots)
+        self.time_labels = tuple(slot.label for slot in self.slots)
+
+    @classmethod
+    def from_row(cls, row, slots):
+        """Build a Medicine from a medicines row and its DoseSlots"""
+        return cls(
+            row['id'], row['user_id'], row['name'], row['dosage'], row['med_type'],
+            row['notes'], row['start_date'], row['end_date'], bool(row['paused']),
+            row['color'], slots
+        )
+
+    def is_scheduled(self, target_date):
+        """Check if the medicine has doses on a 'YYYY-MM-DD' date"""
+        if self.paused or not self.slots:
+            return False
+
+        return self.med_type == 'Daily (Ongoing)' or (
+            self.med_type == 'Date Range' and bool(self.start_date) and bool(self.end_date)
+            and self.start_date <= target_date <= self.end_date
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class IntakeRecord:
+    """One tracking row: whether a dose slot was taken on a date"""
+    id: int
+    medicine_id: int
+    date: str
+    time_slot: str
+    taken: bool
+    timestamp: str
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row['id'], row['medicine_id'], row['date'], row['time_slot'], bool(row['taken']), row['timestamp'])
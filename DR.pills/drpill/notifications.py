@@ -0,0 +1,318 @@
+"""Asynchronous email and SMS delivery of reminder events."""
+import asyncio
+import base64
+import logging
+import random
+import smtplib
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass
+from datetime import datetime
+from email.message import EmailMessage
+
+logger = logging.getLogger("drpill.notifications")
+
+
+@dataclass(slots=True)
+class Notification:
+    """One reminder message to one address, and how its delivery went"""
+    user_id: int
+    medicine_id: int
+    date: str
+    time_slot: str
+    channel: str
+    address: str
+    subject: str
+    body: str
+    status: str = 'pending'
+    attempts: int = 0
+    error: str = None
+    created_at: datetime = None
+    sent_at: datetime = None
+
+
+def notification_key(notification):
+    """(user_id, medicine_id, date, time_slot, channel): one reminder on one channel"""
+    return (notification.user_id, notification.medicine_id, notification.date,
+            notification.time_slot, notification.channel)
+
+
+class DeliveryError(Exception):
+    """A transport could not deliver a message"""
+
+
+class SMTPTransport:
+    """Send email through an SMTP server (blocking calls run in a worker thread)"""
+    channel = 'email'
+
+    def __init__(self, host, port=587, sender="reminders@drpill.local", username=None, password=None, starttls=True):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    def send_blocking(self, address, subject, body):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = address
+        message['Subject'] = subject
+        message.set_content(body)
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+    async def send(self, address, subject, body):
+        await asyncio.to_thread(self.send_blocking, address, subject, body)
+
+
+class HTTPSMSTransport:
+    """Send SMS through an HTTP gateway that takes a form POST of From, To and Body (Twilio's Messages API)"""
+    channel = 'sms'
+
+    def __init__(self, url, sender, username=None, password=None, timeout=30):
+        self.url = url
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+    def send_blocking(self, address, subject, body):
+        data = urllib.parse.urlencode({'From': self.sender, 'To': address, 'Body': body}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=data)
+        if self.username:
+            credentials = base64.b64encode(f"{self.username}:{self.password or ''}".encode("utf-8")).decode("ascii")
+            request.add_header("Authorization", f"Basic {credentials}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as exc:
+            raise DeliveryError(f"sms gateway returned {exc.code} for {address}") from exc
+
+    async def send(self, address, subject, body):
+        await asyncio.to_thread(self.send_blocking, address, subject, body)
+
+
+class FakeTransport:
+    """In-memory stand-in for a mail or SMS gateway, with optional latency and failures"""
+    channel = None
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.sent = []
+
+    async def send(self, address, subject, body):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.random.random() < self.failure_rate:
+            raise DeliveryError(f"{self.channel} gateway rejected message to {address}")
+        self.sent.append((address, subject, body))
+
+
+class FakeSMTPTransport(FakeTransport):
+    channel = 'email'
+
+
+class FakeSMSTransport(FakeTransport):
+    channel = 'sms'
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` sends per second, bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class NotificationPipeline:
+    """Reminder sink that delivers events on an asyncio loop in its own thread
+
+    emit() only hands the event to the loop, so the scheduler and Streamlit
+    never wait on delivery. Events are gathered into batches; each batch loads
+    its users' contacts with one load_contacts(user_ids) call, sends every
+    message concurrently under the rate limit with exponential backoff on
+    failure, and stores the outcomes with one record(notifications) call.
+    Storing is retried like sending before the batch counts as done; outcomes
+    that still could not be stored are kept and stored with the next batch.
+
+    load_sent(events), when given, returns the (user_id, medicine_id, date,
+    time_slot, channel) keys already delivered, so reminders sent before a
+    restart are not sent again.
+    """
+
+    def __init__(self, load_contacts, record, transports, batch_size=200, batch_interval=1.0,
+                 rate_per_second=100, max_concurrency=50, max_attempts=4, backoff=0.5, load_sent=None):
+        self.load_contacts = load_contacts
+        self.record = record
+        self.load_sent = load_sent
+        self.transports = {transport.channel: transport for transport in transports}
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.rate_per_second = rate_per_second
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.stats = {'sent': 0, 'failed': 0, 'retries': 0}
+        self.unrecorded = []
+        self.loop = None
+        self.ready = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start the event loop thread"""
+        self.thread = threading.Thread(target=self.run, name="drpill-notifications", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.queue = asyncio.Queue()
+        self.limiter = RateLimiter(self.rate_per_second)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.ready.set()
+        try:
+            self.loop.run_until_complete(self.consume())
+        finally:
+            self.loop.close()
+
+    def emit(self, event):
+        """Queue a ReminderEvent for delivery (safe to call from any thread)"""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    def flush(self, timeout=None):
+        """Wait until every queued event has been delivered and recorded"""
+        asyncio.run_coroutine_threadsafe(self.queue.join(), self.loop).result(timeout)
+
+    def stop(self):
+        """Deliver what is queued, then stop the loop thread"""
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+        self.thread.join()
+
+    async def consume(self):
+        running = True
+        while running:
+            batch = await self.next_batch()
+            events = [event for event in batch if event is not None]
+            running = len(events) == len(batch)
+            try:
+                if events:
+                    await self.deliver_batch(events)
+                elif self.unrecorded:
+                    await self.record_outcomes([])
+            except Exception:
+                logger.exception("Could not deliver a batch of %s reminders", len(events))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def next_batch(self):
+        """Wait for one event, then collect more until the batch is full or the interval ends"""
+        batch = [await self.queue.get()]
+        deadline = self.loop.time() + self.batch_interval
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            timeout = deadline - self.loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def deliver_batch(self, events):
+        contacts = await asyncio.to_thread(self.load_contacts, sorted({event.user_id for event in events}))
+        sent = await asyncio.to_thread(self.load_sent, events) if self.load_sent else set()
+        # Delivered but not stored yet, so the database does not know about them
+        sent |= {notification_key(n) for n in self.unrecorded if n.status == 'sent'}
+        notifications = [
+            notification
+            for event in events
+            for notification in self.build_notifications(event, contacts.get(event.user_id, {}))
+            if notification_key(notification) not in sent
+        ]
+        await asyncio.gather(*(self.deliver(notification) for notification in notifications))
+        await self.record_outcomes(notifications)
+
+    async def record_outcomes(self, notifications):
+        """Store outcomes with any an earlier batch could not store, retrying with backoff"""
+        pending = self.unrecorded + notifications
+        if not pending:
+            return
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await asyncio.to_thread(self.record, pending)
+            except Exception:
+                if attempt == self.max_attempts:
+                    logger.exception("Could not record %s notifications, keeping them for the next batch", len(pending))
+                    self.unrecorded = pending
+                    return
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            else:
+                self.unrecorded = []
+                return
+
+    def build_notifications(self, event, contact):
+        """One Notification per channel the user has an address for"""
+        created_at = datetime.now()
+        return [
+            Notification(
+                event.user_id, event.medicine_id, event.date, event.time_slot, channel, address,
+                f"Dr.Pill reminder: {event.medicine_name}",
+                f"Time to take {event.medicine_name} ({event.dosage}) at {event.time_slot}.",
+                created_at=created_at
+            )
+            for channel, address in contact.items()
+            if address and channel in self.transports
+        ]
+
+    async def deliver(self, notification):
+        """Send one notification, retrying with exponential backoff"""
+        transport = self.transports[notification.channel]
+        for attempt in range(1, self.max_attempts + 1):
+            notification.attempts = attempt
+            async with self.semaphore:
+                await self.limiter.acquire()
+                try:
+                    await transport.send(notification.address, notification.subject, notification.body)
+                except Exception as exc:
+                    notification.error = str(exc)
+                else:
+                    notification.status = 'sent'
+                    notification.error = None
+                    notification.sent_at = datetime.now()
+                    self.stats['sent'] += 1
+                    return
+            if attempt < self.max_attempts:
+                self.stats['retries'] += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * (1 + random.random()))
+
+        notification.status = 'failed'
+        self.stats['failed'] += 1
+        logger.warning("Giving up on %s reminder to %s: %s", notification.channel, notification.address, notification.error)
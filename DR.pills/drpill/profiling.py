@@ -0,0 +1,206 @@
+"""Per-rerun query and data-call profiling."""
+import contextvars
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+from time import perf_counter
+
+from drpill.resources import singleton
+
+PROFILE_N_PLUS_ONE = 5
+PROFILE_HISTORY = 200
+
+profile_logger = logging.getLogger("drpill.profile")
+current_profile = contextvars.ContextVar("drpill_profile", default=None)
+
+
+class QueryProfile:
+    """SQL statements and data-function calls recorded during one rerun"""
+
+    def __init__(self, page):
+        self.page = page
+        self.started = perf_counter()
+        self.last_activity = self.started
+        self.wall_time = None
+        self.cut_short = False
+        self.queries = {}
+        self.calls = {}
+        self.query_count = 0
+        self.lock = threading.Lock()
+
+    def add_query(self, sql, seconds):
+        """Count one statement and return its stats entry [count, seconds, rows]"""
+        with self.lock:
+            entry = self.queries.setdefault(" ".join(sql.split()), [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            self.query_count += 1
+            self.last_activity = perf_counter()
+        return entry
+
+    def add_rows(self, entry, rows, seconds):
+        with self.lock:
+            entry[1] += seconds
+            entry[2] += rows
+
+    def add_call(self, name, seconds, queries):
+        with self.lock:
+            entry = self.calls.setdefault(name, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += queries
+            self.last_activity = perf_counter()
+
+    def finish(self, cut_short=False):
+        self.wall_time = (self.last_activity if cut_short else perf_counter()) - self.started
+        self.cut_short = cut_short
+
+    def n_plus_one(self):
+        """Statements and data calls repeated often enough in one rerun to look like N+1"""
+        flagged = [
+            {'sql': sql, 'count': count}
+            for sql, (count, seconds, rows) in self.queries.items()
+            if count >= PROFILE_N_PLUS_ONE
+        ]
+        flagged += [
+            {'function': name, 'count': count, 'queries': queries}
+            for name, (count, seconds, queries) in self.calls.items()
+            if count >= PROFILE_N_PLUS_ONE and queries >= count
+        ]
+        return flagged
+
+    def summary(self):
+        """Structured record of the rerun for the log and the debug panel"""
+        return {
+            'page': self.page,
+            'wall_ms': round((self.wall_time or 0) * 1000, 2),
+            'queries': self.query_count,
+            'sql_ms': round(sum(seconds for count, seconds, rows in self.queries.values()) * 1000, 2),
+            'rows': sum(rows for count, seconds, rows in self.queries.values()),
+            'calls': {name: count for name, (count, seconds, queries) in self.calls.items()},
+            'cut_short': self.cut_short,
+            'n_plus_one': self.n_plus_one(),
+        }
+
+
+class TracingCursor(sqlite3.Cursor):
+    """Cursor that reports statements, their time and rows to the current QueryProfile"""
+    entry = None
+
+    def execute(self, sql, parameters=()):
+        profile = current_profile.get()
+        if profile is None:
+            return super().execute(sql, parameters)
+        started = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.entry = profile.add_query(sql, perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        profile = current_profile.get()
+        if profile is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.entry = profile.add_query(sql, perf_counter() - started)
+
+    def record_rows(self, rows, started):
+        profile = current_profile.get()
+        if profile is not None and self.entry is not None:
+            profile.add_rows(self.entry, rows, perf_counter() - started)
+
+    def fetchone(self):
+        started = perf_counter()
+        row = super().fetchone()
+        self.record_rows(0 if row is None else 1, started)
+        return row
+
+    def fetchmany(self, size=None):
+        started = perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.record_rows(len(rows), started)
+        return rows
+
+    def fetchall(self):
+        started = perf_counter()
+        rows = super().fetchall()
+        self.record_rows(len(rows), started)
+        return rows
+
+    def __next__(self):
+        started = perf_counter()
+        row = super().__next__()
+        self.record_rows(1, started)
+        return row
+
+
+def profiled(func):
+    """Decorator: record calls of a data function in the current rerun profile"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        started = perf_counter()
+        queries = profile.query_count
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.add_call(func.__name__, perf_counter() - started, profile.query_count - queries)
+    return wrapper
+
+
+class ProfileStats:
+    """Recent rerun summaries and per-page totals for the whole process"""
+
+    def __init__(self):
+        self.recent = []
+        self.pages = {}
+        self.lock = threading.Lock()
+
+    def record(self, summary):
+        with self.lock:
+            self.recent = self.recent[-(PROFILE_HISTORY - 1):] + [summary]
+            page = self.pages.setdefault(summary['page'], {'reruns': 0, 'wall_ms': 0.0, 'queries': 0, 'sql_ms': 0.0, 'rows': 0})
+            page['reruns'] += 1
+            for key in ('wall_ms', 'queries', 'sql_ms', 'rows'):
+                page[key] += summary[key]
+
+    def page_averages(self):
+        with self.lock:
+            return {
+                name: {
+                    'reruns': totals['reruns'],
+                    **{f"avg_{key}": round(totals[key] / totals['reruns'], 2) for key in ('wall_ms', 'queries', 'sql_ms', 'rows')}
+                }
+                for name, totals in self.pages.items()
+            }
+
+
+@singleton
+def get_profile_stats():
+    """Process-wide rerun statistics; DRPILL_PROFILE_LOG also appends each rerun as a JSON line"""
+    log_path = os.environ.get("DRPILL_PROFILE_LOG")
+    if log_path:
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        profile_logger.addHandler(handler)
+        profile_logger.setLevel(logging.INFO)
+    return ProfileStats()
+
+
+def finish_rerun_profile(profile, cut_short=False):
+    """Stop recording a rerun, log it and add it to the per-page stats"""
+    profile.finish(cut_short)
+    summary = profile.summary()
+    get_profile_stats().record(summary)
+    profile_logger.info(json.dumps(summary))
+    if summary['n_plus_one']:
+        profile_logger.warning("Possible N+1 on %s page: %s", profile.page, json.dumps(summary['n_plus_one']))
+    return summary
@@ -0,0 +1,232 @@
+"""Background reminder scheduler for the Dr.Pill app."""
+import heapq
+import itertools
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("drpill.reminders")
+
+
+@dataclass(frozen=True, slots=True)
+class ReminderEvent:
+    """A dose that is coming due and has not been taken yet"""
+    user_id: int
+    medicine_id: int
+    medicine_name: str
+    dosage: str
+    date: str
+    time_slot: str
+    due_at: datetime
+    remind_at: datetime
+
+
+class LogSink:
+    """Write reminder events to the drpill.reminders logger"""
+
+    def emit(self, event):
+        logger.info(
+            "Reminder for user %s: %s (%s) due at %s",
+            event.user_id, event.medicine_name, event.dosage, event.time_slot
+        )
+
+
+class QueueSink:
+    """Put reminder events on a local queue for another consumer"""
+
+    def __init__(self, maxsize=0):
+        self.events = queue.Queue(maxsize)
+
+    def emit(self, event):
+        self.events.put(event)
+
+
+class StubNotifier:
+    """Record reminder events instead of sending them"""
+
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event):
+        self.sent.append(event)
+
+
+class ReminderScheduler:
+    """Heap of next-due doses for every user, popped on a background thread
+
+    load_user(user_id, target_date) returns (advance_minutes, reminders_enabled,
+    doses) where doses lists the (Medicine, DoseSlot) pairs not taken yet that
+    day; list_users() returns every user id. Each dose is queued at its due
+    time minus the user's advance minutes and sent to every sink once.
+    """
+
+    def __init__(self, load_user, list_users, sinks=(), clock=datetime.now):
+        self.load_user = load_user
+        self.list_users = list_users
+        self.sinks = list(sinks)
+        self.clock = clock
+        self.heap = []
+        self.counter = itertools.count()
+        self.pending = {}
+        self.epoch = 0
+        self.generations = {}
+        self.dirty = set()
+        self.reload_all = True
+        self.emitted = set()
+        self.day = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        """Start the scheduler thread"""
+        self.thread = threading.Thread(target=self.run, name="drpill-reminders", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the scheduler thread"""
+        self.stopped = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def add_sink(self, sink):
+        """Send future reminder events to another sink"""
+        self.sinks.append(sink)
+
+    def invalidate(self, user_id=None):
+        """Drop a user's queued doses (everyone's when user_id is None) and reload them"""
+        with self.lock:
+            if user_id is None:
+                self.epoch += 1
+                self.pending.clear()
+                self.heap = []
+                self.reload_all = True
+            else:
+                self.pending.pop(user_id, None)
+                self.generations[user_id] = self.generations.get(user_id, 0) + 1
+                self.dirty.add(user_id)
+        self.wakeup.set()
+
+    def generation(self, user_id):
+        """Version of a user's queued doses (caller holds the lock)"""
+        return (self.epoch, self.generations.get(user_id, 0))
+
+    def start_day(self, today):
+        """Forget yesterday's doses when the date changes (caller holds the lock)"""
+        if self.day != today:
+            self.day = today
+            self.heap = []
+            self.pending.clear()
+            self.emitted.clear()
+            self.reload_all = True
+
+    def refresh(self, user_id):
+        """Reload one user's untaken doses for today and queue their reminders"""
+        now = self.clock()
+        today = now.strftime('%Y-%m-%d')
+        with self.lock:
+            generation = self.generation(user_id)
+        advance_minutes, reminders_enabled, doses = self.load_user(user_id, today)
+
+        with self.lock:
+            self.start_day(today)
+            if self.generation(user_id) != generation:
+                # A write landed while loading; the next refresh picks it up
+                return doses
+            self.pending[user_id] = doses
+            self.dirty.discard(user_id)
+            if reminders_enabled:
+                for medicine, slot in doses:
+                    due_at = datetime.combine(now.date(), datetime.min.time()) + timedelta(minutes=slot.minutes)
+                    if due_at <= now:
+                        continue
+                    event = ReminderEvent(
+                        user_id, medicine.id, medicine.name, medicine.dosage, today, slot.time,
+                        due_at, due_at - timedelta(minutes=advance_minutes)
+                    )
+                    heapq.heappush(self.heap, (event.remind_at, next(self.counter), generation, event))
+        self.wakeup.set()
+        return doses
+
+    def upcoming(self, user_id):
+        """Today's untaken doses of a user that are still ahead, soonest first"""
+        now = self.clock()
+        with self.lock:
+            doses = self.pending.get(user_id) if self.day == now.strftime('%Y-%m-%d') else None
+        if doses is None:
+            doses = self.refresh(user_id)
+
+        now_seconds = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1000000
+        upcoming = []
+        for medicine, slot in doses:
+            seconds_until = slot.minutes * 60 - now_seconds
+            if seconds_until > 0:
+                upcoming.append({
+                    'medicine': medicine,
+                    'time': slot.time,
+                    'minutes_until': int(seconds_until / 60)
+                })
+
+        return sorted(upcoming, key=lambda x: x['minutes_until'])
+
+    def pop_due(self, now):
+        """Pop every reminder whose time has come, skipping stale and repeated ones"""
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, _, generation, event = heapq.heappop(self.heap)
+                key = (event.user_id, event.medicine_id, event.date, event.time_slot)
+                if generation != self.generation(event.user_id) or key in self.emitted:
+                    continue
+                self.emitted.add(key)
+                due.append(event)
+            next_at = self.heap[0][0] if self.heap else None
+        return due, next_at
+
+    def emit(self, event):
+        for sink in self.sinks:
+            try:
+                sink.emit(event)
+            except Exception:
+                logger.exception("Reminder sink %r failed", sink)
+
+    def run(self):
+        while not self.stopped:
+            with self.lock:
+                self.start_day(self.clock().strftime('%Y-%m-%d'))
+                reload_all, self.reload_all = self.reload_all, False
+            if reload_all:
+                try:
+                    user_ids = self.list_users()
+                except Exception:
+                    logger.exception("Could not list users for reminders")
+                    user_ids = []
+                with self.lock:
+                    self.dirty.update(user_ids)
+
+            with self.lock:
+                dirty = list(self.dirty)
+            for user_id in dirty:
+                try:
+                    self.refresh(user_id)
+                except Exception:
+                    logger.exception("Could not load reminders for user %s", user_id)
+                    with self.lock:
+                        self.dirty.discard(user_id)
+
+            due, next_at = self.pop_due(self.clock())
+            for event in due:
+                self.emit(event)
+
+            now = self.clock()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            wait_until = min(next_at, midnight) if next_at else midnight
+            with self.lock:
+                pending_reload = bool(self.dirty) or self.reload_all
+            if not pending_reload:
+                self.wakeup.wait(max(0, min((wait_until - now).total_seconds(), 60)))
+            self.wakeup.clear()
@@ -0,0 +1,21 @@
+"""Process-wide resources shared by every session."""
+import functools
+import threading
+
+
+def singleton(func):
+    """Decorator: create func(*args) once per process and distinct args, then reuse it"""
+    instances = {}
+    lock = threading.RLock()
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        try:
+            return instances[args]
+        except KeyError:
+            pass
+        with lock:
+            if args not in instances:
+                instances[args] = func(*args)
+            return instances[args]
+    return wrapper
@@ -0,0 +1,160 @@
+"""Reminder scheduling, email/SMS delivery and dose status."""
+import atexit
+import logging
+import os
+from datetime import datetime
+
+from drpill.cache import add_invalidation_listener
+from drpill.db import get_db_connection, serialized_write
+from drpill.medicines import get_medicines_for_date
+from drpill.notifications import FakeSMSTransport, FakeSMTPTransport, HTTPSMSTransport, NotificationPipeline, SMTPTransport
+from drpill.profiling import profiled
+from drpill.reminders import LogSink, ReminderScheduler
+from drpill.resources import singleton
+from drpill.tracking import get_intake_status_map
+from drpill.users import get_settings, get_user_by_id, get_user_ids
+
+logger = logging.getLogger("drpill.notifications")
+
+
+def load_reminder_doses(user_id, target_date):
+    """Reminder settings and untaken doses of a user on a date, for the scheduler"""
+    if get_user_by_id(user_id) is None:
+        return 0, False, []
+    
+    settings = get_settings(user_id)
+    status_map = get_intake_status_map(user_id, target_date)
+    doses = [
+        (medicine, slot)
+        for medicine in get_medicines_for_date(user_id, target_date)
+        for slot in medicine.slots
+        if not status_map.get((medicine.id, target_date, slot.time))
+    ]
+    return settings['reminder_advance_minutes'], bool(settings['reminders_enabled']), doses
+
+
+@profiled
+def get_contacts(user_ids):
+    """Get the email address and phone of several users, keyed by user id and channel"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    placeholders = ", ".join("?" * len(user_ids))
+    cursor.execute(f"SELECT id, phone, email_address FROM users WHERE id IN ({placeholders})", list(user_ids))
+    contacts = {row['id']: {'email': row['email_address'], 'sms': row['phone']} for row in cursor.fetchall()}
+    conn.close()
+    
+    return contacts
+
+
+@profiled
+def get_sent_notifications(events):
+    """Keys of the reminders in events that were already delivered, per channel"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    user_ids = sorted({event.user_id for event in events})
+    dates = sorted({event.date for event in events})
+    cursor.execute(f"""
+        SELECT user_id, medicine_id, date, time_slot, channel FROM notifications
+        WHERE status = 'sent'
+          AND user_id IN ({", ".join("?" * len(user_ids))})
+          AND date IN ({", ".join("?" * len(dates))})
+    """, user_ids + dates)
+    sent = {tuple(row) for row in cursor.fetchall()}
+    conn.close()
+    
+    return sent
+
+
+@serialized_write
+def record_notifications(notifications):
+    """Store the delivery outcome of a batch of notifications"""
+    conn = get_db_connection()
+    conn.executemany("""
+        INSERT INTO notifications (user_id, medicine_id, date, time_slot, channel, address, status, attempts, error, created_at, sent_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (n.user_id, n.medicine_id, n.date, n.time_slot, n.channel, n.address,
+         n.status, n.attempts, n.error, n.created_at, n.sent_at)
+        for n in notifications
+    ])
+    conn.commit()
+    conn.close()
+
+
+def get_notification_transports():
+    """Email/SMS transports configured through the environment (none turns notifications off)"""
+    if os.environ.get("DRPILL_FAKE_NOTIFICATIONS"):
+        return [FakeSMTPTransport(), FakeSMSTransport()]
+    
+    transports = []
+    if os.environ.get("DRPILL_SMTP_HOST"):
+        transports.append(SMTPTransport(
+            os.environ["DRPILL_SMTP_HOST"],
+            int(os.environ.get("DRPILL_SMTP_PORT", 587)),
+            os.environ.get("DRPILL_SMTP_SENDER", "reminders@drpill.local"),
+            os.environ.get("DRPILL_SMTP_USER"),
+            os.environ.get("DRPILL_SMTP_PASSWORD")
+        ))
+    if os.environ.get("DRPILL_SMS_URL"):
+        transports.append(HTTPSMSTransport(
+            os.environ["DRPILL_SMS_URL"],
+            os.environ.get("DRPILL_SMS_SENDER", "DrPill"),
+            os.environ.get("DRPILL_SMS_USER"),
+            os.environ.get("DRPILL_SMS_PASSWORD")
+        ))
+    elif transports:
+        logger.info("SMS reminders are off: set DRPILL_SMS_URL to send them")
+    return transports
+
+
+@singleton
+def get_notification_pipeline():
+    """Process-wide notification pipeline, or None when no transport is configured"""
+    transports = get_notification_transports()
+    if not transports:
+        return None
+    pipeline = NotificationPipeline(get_contacts, record_notifications, transports, load_sent=get_sent_notifications)
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    return pipeline
+
+
+@singleton
+def get_reminder_scheduler():
+    """Process-wide reminder scheduler, running on its own thread"""
+    scheduler = ReminderScheduler(load_reminder_doses, get_user_ids, [LogSink()])
+    pipeline = get_notification_pipeline()
+    if pipeline is not None:
+        scheduler.add_sink(pipeline)
+    add_invalidation_listener(scheduler.invalidate)
+    scheduler.start()
+    atexit.register(scheduler.stop)
+    return scheduler
+
+
+@profiled
+def get_upcoming_reminders(user_id):
+    """Get upcoming reminders"""
+    return get_reminder_scheduler().upcoming(user_id)
+
+
+def get_medicine_status(medicine, slot, current_time, user_id, status_map=None):
+    """Get medicine status"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    settings = get_settings(user_id)
+    if status_map is None:
+        status_map = get_intake_status_map(user_id, today)
+    
+    if status_map.get((medicine.id, today, slot.time)):
+        return 'taken'
+    
+    current_minutes = current_time.hour * 60 + current_time.minute
+    
+    if current_minutes > slot.minutes:
+        return 'missed'
+    elif current_minutes >= slot.minutes - settings['reminder_advance_minutes']:
+        return 'upcoming'
+    
+    return 'scheduled'
@@ -0,0 +1,168 @@
+"""Intake tracking: which dose slots were taken on which dates."""
+from datetime import datetime
+
+from drpill.cache import cached_per_user, invalidate_user_cache
+from drpill.db import get_db_connection, serialized_write
+from drpill.medicines import fetch_medicines, get_medicine_owner
+from drpill.models import IntakeRecord
+from drpill.profiling import profiled
+
+
+def update_intake_rollup(cursor, medicine_id, target_date, time_slot, delta):
+    """Apply a taken/untaken toggle to the daily_adherence row for that day"""
+    medicines = fetch_medicines(cursor, "m.id = ?", (medicine_id,))
+    if not medicines:
+        return
+    
+    med = medicines[0]
+    count = med.times.count(time_slot)
+    if count and med.is_scheduled(target_date):
+        cursor.execute(
+            "UPDATE daily_adherence SET taken = taken + ? WHERE user_id=? AND date=?",
+            (delta * count, med.user_id, target_date)
+        )
+
+
+@serialized_write
+def toggle_intake(medicine_id, target_date, time_slot):
+    """Toggle medicine intake"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        INSERT INTO tracking (medicine_id, date, time_slot, taken, timestamp) VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT (medicine_id, date, time_slot) DO UPDATE SET
+            taken = NOT tracking.taken,
+            timestamp = CASE WHEN tracking.taken THEN NULL ELSE excluded.timestamp END
+        RETURNING taken
+    """, (medicine_id, target_date, time_slot, datetime.now()))
+    taken = cursor.fetchone()['taken']
+    
+    update_intake_rollup(cursor, medicine_id, target_date, time_slot, 1 if taken else -1)
+    user_id = get_medicine_owner(cursor, medicine_id)
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id)
+
+
+@profiled
+def get_intake_status(medicine_id, target_date, time_slot):
+    """Check if medicine was taken"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "SELECT taken FROM tracking WHERE medicine_id=? AND date=? AND time_slot=?",
+        (medicine_id, target_date, time_slot)
+    )
+    result = cursor.fetchone()
+    conn.close()
+    
+    return result['taken'] if result else False
+
+
+@cached_per_user
+def get_intake_records(user_id, start_date, end_date=None):
+    """Get tracking rows for a user's medicines keyed by (medicine_id, date, time_slot)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT t.* FROM tracking t
+        JOIN medicines m ON t.medicine_id = m.id
+        WHERE m.user_id = ? AND t.date BETWEEN ? AND ?
+        ORDER BY t.id
+    """, (user_id, start_date, end_date or start_date))
+    rows = cursor.fetchall()
+    conn.close()
+    
+    records = {}
+    for row in rows:
+        records.setdefault((row['medicine_id'], row['date'], row['time_slot']), IntakeRecord.from_row(row))
+    return records
+
+
+@profiled
+def get_intake_status_map(user_id, start_date, end_date=None):
+    """Get intake status for every tracked slot of a user in a date range"""
+    records = get_intake_records(user_id, start_date, end_date)
+    return {key: record.taken for key, record in records.items()}
+
+
+@profiled
+def get_tracking_records_for_medicine(med_id):
+    """Get all tracking records for a specific medicine"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT * FROM tracking WHERE medicine_id=?", (med_id,))
+    records = [IntakeRecord.from_row(row) for row in cursor.fetchall()]
+    conn.close()
+    
+    return records
+
+
+@cached_per_user
+def get_taken_counts(user_id):
+    """Get how many times each of a user's medicines was taken, keyed by medicine_id"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT t.medicine_id, COUNT(*) AS count FROM tracking t
+        JOIN medicines m ON t.medicine_id = m.id
+        WHERE m.user_id = ? AND t.taken = 1
+        GROUP BY t.medicine_id
+    """, (user_id,))
+    counts = {row['medicine_id']: row['count'] for row in cursor.fetchall()}
+    conn.close()
+    
+    return counts
+
+
+@profiled
+def get_total_taken_count(med_id):
+    """Get total number of times a medicine was taken"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT COUNT(*) as count FROM tracking WHERE medicine_id=? AND taken=1", (med_id,))
+    result = cursor.fetchone()
+    conn.close()
+    
+    return result['count'] if result else 0
+
+
+@cached_per_user
+def get_all_tracking_records(user_id):
+    """Get all tracking records for a user"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT t.* FROM tracking t
+        JOIN medicines m ON t.medicine_id = m.id
+        WHERE m.user_id = ?
+    """, (user_id,))
+    
+    records = [IntakeRecord.from_row(row) for row in cursor.fetchall()]
+    conn.close()
+    
+    return records
+
+
+@serialized_write
+def clear_tracking_for_medicines(user_id):
+    """Clear all tracking records for user's medicines"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        DELETE FROM tracking
+        WHERE medicine_id IN (SELECT id FROM medicines WHERE user_id = ?)
+    """, (user_id,))
+    cursor.execute("UPDATE daily_adherence SET taken = 0 WHERE user_id = ?", (user_id,))
+    
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id)
@@ -0,0 +1,174 @@
+"""Users, their settings and account deletion."""
+import sqlite3
+
+from drpill.cache import cached_per_user, invalidate_user_cache
+from drpill.db import get_db_connection, serialized_write
+from drpill.profiling import profiled
+
+
+@serialized_write
+def create_user(name, email, password, age, conditions="", phone="", email_address=""):
+    """Create a new user in database"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(
+            "INSERT INTO users (name, email, password, age, conditions, phone, email_address) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (name, email, password, age, conditions, phone, email_address)
+        )
+        
+        user_id = cursor.lastrowid
+        
+        # Create default settings for new user
+        cursor.execute(
+            "INSERT INTO settings (user_id, reminders_enabled, reminder_advance_minutes) VALUES (?, 1, 30)",
+            (user_id,)
+        )
+        
+        conn.commit()
+        conn.close()
+        return True
+    except sqlite3.IntegrityError:
+        conn.close()
+        return False
+
+
+@profiled
+def login_user(email, password):
+    """Authenticate user"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "SELECT * FROM users WHERE email=? AND password=?",
+        (email, password)
+    )
+    user = cursor.fetchone()
+    conn.close()
+    
+    if user:
+        return (user['id'], user['name'], user['email'], user['password'],
+               user['age'], user['conditions'], user['phone'], user['email_address'])
+    return None
+
+
+@cached_per_user
+def get_user_by_id(user_id):
+    """Get user by ID"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT * FROM users WHERE id=?", (user_id,))
+    user = cursor.fetchone()
+    conn.close()
+    
+    if user:
+        return (user['id'], user['name'], user['email'], user['password'],
+               user['age'], user['conditions'], user['phone'], user['email_address'])
+    return None
+
+
+@serialized_write
+def update_user(user_id, name, age, conditions, phone, email_address):
+    """Update user information"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "UPDATE users SET name=?, age=?, conditions=?, phone=?, email_address=? WHERE id=?",
+        (name, age, conditions, phone, email_address, user_id)
+    )
+    
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id)
+
+
+@cached_per_user
+def get_settings(user_id):
+    """Get user settings"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT * FROM settings WHERE user_id=?", (user_id,))
+    result = cursor.fetchone()
+    conn.close()
+    
+    if result:
+        return {
+            'reminders_enabled': result['reminders_enabled'],
+            'reminder_advance_minutes': result['reminder_advance_minutes']
+        }
+    else:
+        create_default_settings(user_id)
+        return {'reminders_enabled': True, 'reminder_advance_minutes': 30}
+
+
+@serialized_write
+def create_default_settings(user_id):
+    """Create default settings for a user"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT OR IGNORE INTO settings (user_id, reminders_enabled, reminder_advance_minutes) VALUES (?, 1, 30)",
+        (user_id,)
+    )
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id)
+
+
+@serialized_write
+def update_settings(user_id, reminders_enabled, reminder_advance_minutes):
+    """Update user settings"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "UPDATE settings SET reminders_enabled=?, reminder_advance_minutes=? WHERE user_id=?",
+        (reminders_enabled, reminder_advance_minutes, user_id)
+    )
+    
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id)
+
+
+@profiled
+def get_user_ids():
+    """Get the ids of all users"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT id FROM users")
+    user_ids = [row['id'] for row in cursor.fetchall()]
+    conn.close()
+    
+    return user_ids
+
+
+@serialized_write
+def delete_user_account(user_id):
+    """Delete user account and all associated data"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    
+    cursor.execute("DELETE FROM tracking WHERE medicine_id IN (SELECT id FROM medicines WHERE user_id=?)", (user_id,))
+    cursor.execute("DELETE FROM medicine_slots WHERE medicine_id IN (SELECT id FROM medicines WHERE user_id=?)", (user_id,))
+    
+    
+    cursor.execute("DELETE FROM medicines WHERE user_id=?", (user_id,))
+    
+  
+    cursor.execute("DELETE FROM settings WHERE user_id=?", (user_id,))
+    cursor.execute("DELETE FROM daily_adherence WHERE user_id=?", (user_id,))
+    cursor.execute("DELETE FROM notifications WHERE user_id=?", (user_id,))
+    
+
+    cursor.execute("DELETE FROM users WHERE id=?", (user_id,))
+    
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id, medicines=True)
@@ -0,0 +1,176 @@
+"""Stress test for concurrent sessions writing to drpill.db.
+
+Simulates N Streamlit sessions that toggle intakes and read their
+adherence at the same time, then checks that no write was lost and that
+the daily_adherence rollup still matches the tracking table. Each session
+also has a reader that keeps dropping and lazily refilling its rollup rows,
+so gap fills race the session's own toggles.
+
+Usage:
+    python stress_writes.py --sessions 16 --toggles 200
+"""
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from benchmarks import open_database
+from drpill.adherence import get_adherence_rollup, get_adherence_stats, get_daily_adherence
+from drpill.cache import invalidate_user_cache
+from drpill.db import get_db_connection, serialized_write
+from drpill.medicines import save_medicine
+from drpill.tracking import get_intake_status_map, toggle_intake
+from drpill.users import create_user, login_user
+
+
+def seed_sessions(sessions, medicines_per_user):
+    """Create one user with a few daily medicines per session"""
+    users = []
+    for n in range(sessions):
+        create_user(f"Stress {n}", f"stress{n}@example.com", "pw", 30)
+        user_id = login_user(f"stress{n}@example.com", "pw")[0]
+        med_ids = [
+            save_medicine(user_id, f"Med {m}", "1 tablet", "Daily (Ongoing)",
+                          "08:00, 14:00, 20:00", "", "", None, None, "#9c27b0")
+            for m in range(medicines_per_user)
+        ]
+        users.append((user_id, med_ids))
+    return users
+
+
+def run_session(user_id, med_ids, toggles, days, results, errors):
+    """One simulated session: toggle random doses and re-read adherence"""
+    rnd = random.Random(user_id)
+    today = date.today()
+    counts = {}
+    latencies = []
+    for n in range(toggles):
+        key = (
+            rnd.choice(med_ids),
+            (today - timedelta(days=rnd.randrange(days))).strftime('%Y-%m-%d'),
+            rnd.choice(["08:00", "14:00", "20:00"]),
+        )
+        started = time.perf_counter()
+        try:
+            toggle_intake(*key)
+            counts[key] = counts.get(key, 0) + 1
+            if n % 10 == 0:
+                get_adherence_stats(user_id)
+        except Exception as exc:
+            errors.append(repr(exc))
+        latencies.append(time.perf_counter() - started)
+    results[user_id] = (counts, latencies)
+
+
+@serialized_write
+def drop_rollup_rows(user_id, start_date, end_date):
+    """Delete stored rollup rows so the next read has to fill the gap again"""
+    conn = get_db_connection()
+    conn.execute(
+        "DELETE FROM daily_adherence WHERE user_id=? AND date BETWEEN ? AND ?",
+        (user_id, start_date, end_date)
+    )
+    conn.commit()
+    conn.close()
+    invalidate_user_cache(user_id)
+
+
+def run_rollup_reader(user_id, days, stop, errors):
+    """Keep dropping a few days of rollup and reading them back while toggles run"""
+    rnd = random.Random(-user_id)
+    today = date.today()
+    while not stop.is_set():
+        first = rnd.randrange(days)
+        start_date = (today - timedelta(days=first)).strftime('%Y-%m-%d')
+        end_date = (today - timedelta(days=max(0, first - 3))).strftime('%Y-%m-%d')
+        try:
+            drop_rollup_rows(user_id, start_date, end_date)
+            get_adherence_rollup(user_id, start_date, end_date)
+        except Exception as exc:
+            errors.append(repr(exc))
+
+
+def stored_rollup(user_id, start_date, end_date):
+    """daily_adherence rows as stored, without filling gaps"""
+    conn = get_db_connection()
+    rows = conn.execute(
+        "SELECT date, scheduled, taken FROM daily_adherence WHERE user_id=? AND date BETWEEN ? AND ?",
+        (user_id, start_date, end_date)
+    ).fetchall()
+    conn.close()
+    return {row['date']: (row['scheduled'], row['taken']) for row in rows}
+
+
+def verify(users, results, days):
+    """Check final tracking state and rollup against the expected toggles"""
+    problems = []
+    today = date.today()
+    start_date = (today - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    end_date = today.strftime('%Y-%m-%d')
+    for user_id, med_ids in users:
+        counts, _ = results[user_id]
+        status = get_intake_status_map(user_id, start_date, end_date)
+        for key, count in counts.items():
+            if bool(status.get(key)) != (count % 2 == 1):
+                problems.append(f"user {user_id}: {key} toggled {count}x but taken={status.get(key)}")
+        expected = get_daily_adherence(user_id, start_date, end_date)
+        for day, counts in sorted(stored_rollup(user_id, start_date, end_date).items()):
+            if counts != expected[day]:
+                problems.append(f"user {user_id}: daily_adherence {day} stored {counts}, actual {expected[day]}")
+        if get_adherence_rollup(user_id, start_date, end_date) != expected:
+            problems.append(f"user {user_id}: daily_adherence rollup out of sync")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--toggles", type=int, default=200)
+    parser.add_argument("--medicines", type=int, default=5)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    open_database(tempfile.mkdtemp(prefix="drpill-stress-"))
+    users = seed_sessions(args.sessions, args.medicines)
+
+    results = {}
+    errors = []
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=run_session, args=(user_id, med_ids, args.toggles, args.days, results, errors))
+        for user_id, med_ids in users
+    ]
+    readers = [
+        threading.Thread(target=run_rollup_reader, args=(user_id, args.days, stop, errors))
+        for user_id, _ in users
+    ]
+    started = time.perf_counter()
+    for thread in threads + readers:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    latencies = sorted(l for _, session_latencies in results.values() for l in session_latencies)
+    total = len(latencies)
+    print(f"{args.sessions} sessions x {args.toggles} toggles in {elapsed:.2f}s ({total / elapsed:.0f} ops/s)")
+    print(f"p50 {latencies[total // 2] * 1000:.1f} ms, p95 {latencies[int(total * 0.95)] * 1000:.1f} ms")
+
+    problems = errors + verify(users, results, args.days)
+    for problem in problems[:20]:
+        print("FAIL:", problem)
+    if problems:
+        print(f"{len(problems)} problem(s)")
+        return 1
+    print("OK: no lost writes, no lock errors, rollup in sync")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Shared fixtures: the tests run against one throwaway drpill.db."""
+import itertools
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from drpill.db import DB_PATH, get_db_connection, init_database
+from drpill.medicines import get_user_medicines, save_medicine
+from drpill.users import create_user
+
+user_numbers = itertools.count(1)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database(tmp_path_factory):
+    """Create the schema in a temporary directory; the pool keeps using it for the session"""
+    workdir = tmp_path_factory.mktemp("drpill")
+    os.chdir(workdir)
+    init_database(DB_PATH)
+    return os.path.join(workdir, DB_PATH)
+
+
+@pytest.fixture
+def user_id():
+    """A new user with no medicines"""
+    n = next(user_numbers)
+    email = f"test{n}@example.com"
+    assert create_user(f"Test {n}", email, "pw", 30, email_address=email)
+    conn = get_db_connection()
+    row = conn.execute("SELECT id FROM users WHERE email=?", (email,)).fetchone()
+    conn.close()
+    return row['id']
+
+
+@pytest.fixture
+def add_medicine(user_id):
+    """Factory: save a medicine for the test user and return its Medicine record"""
+    def add(times="08:00", med_type="Daily (Ongoing)", start_date="", end_date="", labels=None):
+        labels = labels or ", ".join("Dose" for _ in times.split(", "))
+        med_id = save_medicine(user_id, "Test medicine", "1 tablet", med_type, times, labels, "",
+                               start_date, end_date, "#9c27b0")
+        return next(med for med in get_user_medicines(user_id) if med.id == med_id)
+    return add
@@ -0,0 +1,101 @@
+import threading
+import time
+from datetime import date, timedelta
+
+from drpill import adherence
+from drpill.adherence import get_adherence_rollup, get_daily_adherence
+from drpill.db import get_db_connection
+from drpill.medicines import delete_medicine, toggle_medicine_pause, update_medicine
+from drpill.tracking import toggle_intake
+
+
+def days_ago(n):
+    return (date.today() - timedelta(days=n)).strftime('%Y-%m-%d')
+
+
+def stored_rollup(user_id, target_date):
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT scheduled, taken FROM daily_adherence WHERE user_id=? AND date=?", (user_id, target_date)
+    ).fetchone()
+    conn.close()
+    return row and (row['scheduled'], row['taken'])
+
+
+def test_gap_fill_does_not_lose_concurrent_toggle(user_id, add_medicine, monkeypatch):
+    med = add_medicine("08:00")
+    day = days_ago(1)
+    counting = threading.Event()
+    original = adherence.get_daily_adherence
+
+    def slow_daily_adherence(*args):
+        counts = original(*args)
+        counting.set()
+        time.sleep(0.2)
+        return counts
+
+    monkeypatch.setattr(adherence, "get_daily_adherence", slow_daily_adherence)
+    reader = threading.Thread(target=get_adherence_rollup, args=(user_id, day, day))
+    reader.start()
+    counting.wait(5)
+    toggle_intake(med.id, day, "08:00")
+    reader.join()
+    monkeypatch.undo()
+
+    assert stored_rollup(user_id, day) == (1, 1)
+    assert get_adherence_rollup(user_id, day, day)[day] == (1, 1)
+
+
+def test_toggles_keep_stored_rollup_in_sync(user_id, add_medicine):
+    med = add_medicine("08:00, 20:00")
+    start, end = days_ago(3), days_ago(1)
+    get_adherence_rollup(user_id, start, end)
+
+    toggle_intake(med.id, days_ago(2), "08:00")
+    toggle_intake(med.id, days_ago(2), "20:00")
+    toggle_intake(med.id, days_ago(1), "20:00")
+    toggle_intake(med.id, days_ago(1), "20:00")
+
+    assert stored_rollup(user_id, days_ago(2)) == (2, 2)
+    assert stored_rollup(user_id, days_ago(1)) == (2, 0)
+    assert get_adherence_rollup(user_id, start, end) == get_daily_adherence(user_id, start, end)
+
+
+def stored_range(user_id, start_date, end_date):
+    conn = get_db_connection()
+    rows = conn.execute(
+        "SELECT date, scheduled, taken FROM daily_adherence WHERE user_id=? AND date BETWEEN ? AND ?",
+        (user_id, start_date, end_date)
+    ).fetchall()
+    conn.close()
+    return {row['date']: (row['scheduled'], row['taken']) for row in rows}
+
+
+def test_medicine_changes_keep_stored_rollup_in_sync(user_id, add_medicine):
+    daily = add_medicine("08:00, 20:00")
+    start, end = days_ago(10), days_ago(1)
+    get_adherence_rollup(user_id, start, end)
+    toggle_intake(daily.id, days_ago(4), "08:00")
+
+    ranged = add_medicine("09:00", "Date Range", days_ago(6), days_ago(3))
+    toggle_intake(ranged.id, days_ago(3), "09:00")
+    toggle_intake(ranged.id, days_ago(7), "09:00")
+    assert stored_range(user_id, start, end) == get_daily_adherence(user_id, start, end)
+
+    update_medicine(ranged.id, ranged.name, ranged.dosage, "Date Range", "09:00, 21:00", "", "",
+                    days_ago(8), days_ago(5), ranged.color)
+    assert stored_range(user_id, start, end) == get_daily_adherence(user_id, start, end)
+
+    toggle_medicine_pause(daily.id)
+    assert stored_range(user_id, start, end) == get_daily_adherence(user_id, start, end)
+    toggle_medicine_pause(daily.id)
+    delete_medicine(ranged.id)
+    assert stored_range(user_id, start, end) == get_daily_adherence(user_id, start, end)
+    assert stored_range(user_id, days_ago(4), days_ago(4)) == {days_ago(4): (2, 1)}
+
+
+def test_future_days_are_not_stored(user_id, add_medicine):
+    add_medicine("08:00")
+    tomorrow = (date.today() + timedelta(days=1)).strftime('%Y-%m-%d')
+    assert get_adherence_rollup(user_id, days_ago(0), tomorrow)[tomorrow] == (1, 0)
+    assert stored_rollup(user_id, tomorrow) is None
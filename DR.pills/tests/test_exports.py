@@ -0,0 +1,123 @@
+import json
+from datetime import date, timedelta
+
+from drpill.db import get_db_connection
+from drpill.exports import export_user_data, import_user_data
+from drpill.medicines import save_medicine
+from drpill.tracking import get_intake_status_map, toggle_intake
+from drpill.users import get_user_by_id
+
+
+def days_ago(n):
+    return (date.today() - timedelta(days=n)).strftime('%Y-%m-%d')
+
+
+def baseline_export(user_id):
+    """The JSON export as the app built it before the drpill package, straight from the tables"""
+    user = get_user_by_id(user_id)
+    conn = get_db_connection()
+    medicines = conn.execute("SELECT * FROM medicines WHERE user_id=?", (user_id,)).fetchall()
+    tracking = conn.execute("""
+        SELECT t.* FROM tracking t
+        JOIN medicines m ON t.medicine_id = m.id
+        WHERE m.user_id = ?
+    """, (user_id,)).fetchall()
+    conn.close()
+    return json.dumps({
+        'user': {
+            'name': user[1], 'email': user[2], 'age': user[4],
+            'conditions': user[5], 'phone': user[6], 'email_address': user[7]
+        },
+        'medicines': [
+            {key: m[key] for key in ('id', 'name', 'dosage', 'med_type', 'times', 'time_labels', 'notes',
+                                     'start_date', 'end_date', 'paused', 'color')}
+            for m in medicines
+        ],
+        'tracking': [
+            {key: t[key] for key in ('id', 'medicine_id', 'date', 'time_slot', 'taken', 'timestamp')}
+            for t in tracking
+        ],
+    }, indent=2)
+
+
+def test_export_matches_baseline_for_short_and_empty_labels(user_id):
+    short = save_medicine(user_id, "Short labels", "1 tablet", "Daily (Ongoing)", "08:00, 14:00, 20:00", "A",
+                          "", "", "", "#9c27b0")
+    save_medicine(user_id, "No labels", "5 ml", "Daily (Ongoing)", "08:00, 20:00", "", "", "", "", "#9c27b0")
+    toggle_intake(short, days_ago(1), "14:00")
+
+    exported = export_user_data(user_id)
+
+    assert exported == baseline_export(user_id)
+    medicines = json.loads(exported)['medicines']
+    assert [(m['times'], m['time_labels']) for m in medicines] == [("08:00, 14:00, 20:00", "A"), ("08:00, 20:00", "")]
+
+
+def test_import_merge_counts(user_id, add_medicine):
+    med = add_medicine("08:00, 20:00")
+    toggle_intake(med.id, days_ago(2), "08:00")
+    toggle_intake(med.id, days_ago(1), "08:00")
+    toggle_intake(med.id, days_ago(1), "20:00")
+    toggle_intake(med.id, days_ago(1), "20:00")
+
+    backup = {
+        'medicines': [
+            {'id': 501, 'name': med.name, 'dosage': med.dosage, 'med_type': med.med_type, 'times': "08:00, 20:00"},
+            {'id': 502, 'name': "Imported", 'dosage': "5 ml", 'med_type': "Daily (Ongoing)", 'times': "09:00"},
+        ],
+        'tracking': [
+            {'medicine_id': 501, 'date': days_ago(2), 'time_slot': "08:00", 'taken': 1},
+            {'medicine_id': 501, 'date': days_ago(2), 'time_slot': "20:00", 'taken': 0},
+            {'medicine_id': 501, 'date': days_ago(1), 'time_slot': "08:00", 'taken': 0},
+            {'medicine_id': 501, 'date': days_ago(1), 'time_slot': "20:00", 'taken': 1},
+            {'medicine_id': 501, 'date': days_ago(3), 'time_slot': "08:00", 'taken': 1},
+            {'medicine_id': 502, 'date': days_ago(1), 'time_slot': "09:00", 'taken': 1},
+            {'medicine_id': 999, 'date': days_ago(1), 'time_slot': "09:00", 'taken': 1},
+            {'medicine_id': 501, 'date': "", 'time_slot': "08:00", 'taken': 1},
+        ],
+    }
+    report = import_user_data(user_id, backup)
+
+    assert report['medicines_matched'] == 1
+    assert report['medicines_added'] == 1
+    assert report['tracking_added'] == 3
+    assert report['tracking_updated'] == 1
+    assert report['tracking_unchanged'] == 2
+    assert report['tracking_skipped'] == 2
+
+    status = get_intake_status_map(user_id, days_ago(3), days_ago(1))
+    assert status[(med.id, days_ago(2), "08:00")]
+    assert not status[(med.id, days_ago(2), "20:00")]
+    assert status[(med.id, days_ago(1), "08:00")]
+    assert status[(med.id, days_ago(1), "20:00")]
+    assert status[(med.id, days_ago(3), "08:00")]
+
+
+def test_reimporting_an_export_changes_nothing(user_id, add_medicine):
+    med = add_medicine("08:00")
+    toggle_intake(med.id, days_ago(1), "08:00")
+    backup = json.loads(export_user_data(user_id))
+
+    report = import_user_data(user_id, backup)
+
+    assert (report['medicines_matched'], report['medicines_added']) == (1, 0)
+    assert (report['tracking_added'], report['tracking_updated'], report['tracking_unchanged']) == (0, 0, 1)
+    assert export_user_data(user_id) == json.dumps(backup, indent=2)
+
+
+def test_import_skips_medicines_with_invalid_times(user_id):
+    backup = {
+        'medicines': [
+            {'id': 601, 'name': "Bad times", 'dosage': "1 tablet", 'med_type': "Daily (Ongoing)", 'times': "8am, 20:00"},
+            {'id': 602, 'name': "Good times", 'dosage': "1 tablet", 'med_type': "Daily (Ongoing)", 'times': "08:00"},
+        ],
+        'tracking': [
+            {'medicine_id': 601, 'date': days_ago(1), 'time_slot': "8am", 'taken': 1},
+            {'medicine_id': 602, 'date': days_ago(1), 'time_slot': "08:00", 'taken': 1},
+        ],
+    }
+    report = import_user_data(user_id, backup)
+
+    assert (report['medicines_added'], report['medicines_skipped']) == (1, 1)
+    assert (report['tracking_added'], report['tracking_skipped']) == (1, 1)
+    assert [m['name'] for m in json.loads(export_user_data(user_id))['medicines']] == ["Good times"]
@@ -0,0 +1,124 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from drpill.medicines import ScheduleIndex, get_doses_between, get_schedule_index, toggle_medicine_pause
+from drpill.models import DoseSlot, Medicine
+from drpill.tracking import toggle_intake
+
+
+def days_from_today(n):
+    return (date.today() + timedelta(days=n)).strftime('%Y-%m-%d')
+
+
+def dose_keys(doses):
+    return [(dose['medicine_id'], dose['slot_time']) for dose in doses]
+
+
+def test_doses_between_follow_is_scheduled(user_id, add_medicine):
+    daily = add_medicine("08:00, 12:00, 20:00")
+    running = add_medicine("09:00", "Date Range", days_from_today(-2), days_from_today(2))
+    ended = add_medicine("09:00", "Date Range", days_from_today(-9), days_from_today(-1))
+    upcoming = add_medicine("09:00", "Date Range", days_from_today(1), days_from_today(9))
+    undated = add_medicine("09:00", "Date Range")
+    paused = add_medicine("10:00")
+    toggle_medicine_pause(paused.id)
+
+    today = days_from_today(0)
+    doses = get_doses_between(today, "08:00", "12:00", user_id)
+
+    assert dose_keys(doses) == [(daily.id, "08:00"), (running.id, "09:00"), (daily.id, "12:00")]
+    for med in (daily, running, ended, upcoming, undated):
+        assert (med.id in {key[0] for key in dose_keys(doses)}) == med.is_scheduled(today)
+
+
+def test_doses_between_on_range_edges(user_id, add_medicine):
+    ranged = add_medicine("09:00", "Date Range", days_from_today(3), days_from_today(5))
+
+    for offset, expected in ((2, False), (3, True), (5, True), (6, False)):
+        doses = get_doses_between(days_from_today(offset), "00:00", "23:59", user_id)
+        assert (ranged.id in {key[0] for key in dose_keys(doses)}) == expected
+
+
+def medicine(med_id, med_type="Date Range", start_date="", end_date="", paused=False, times=("08:00",)):
+    slots = [DoseSlot.parse(slot_time) for slot_time in times]
+    return Medicine(med_id, 1, f"Med {med_id}", "1 tablet", med_type, "", start_date, end_date, paused, "#9c27b0", slots)
+
+
+def ids(medicines):
+    return [med.id for med in medicines]
+
+
+@pytest.mark.parametrize("target_date, expected", [
+    ("2024-03-09", [1]),
+    ("2024-03-10", [1, 2]),
+    ("2024-03-12", [1, 2]),
+    ("2024-03-15", [1, 2]),
+    ("2024-03-16", [1]),
+])
+def test_schedule_index_range_is_inclusive(target_date, expected):
+    index = ScheduleIndex([
+        medicine(1, "Daily (Ongoing)"),
+        medicine(2, start_date="2024-03-10", end_date="2024-03-15"),
+    ])
+    assert ids(index.medicines_on(target_date)) == expected
+
+
+def test_schedule_index_single_day_and_adjacent_ranges():
+    index = ScheduleIndex([
+        medicine(1, start_date="2024-03-10", end_date="2024-03-10"),
+        medicine(2, start_date="2024-03-05", end_date="2024-03-10"),
+        medicine(3, start_date="2024-03-10", end_date="2024-03-20"),
+        medicine(4, start_date="2024-03-11", end_date="2024-03-11"),
+    ])
+    assert ids(index.medicines_on("2024-03-09")) == [2]
+    assert ids(index.medicines_on("2024-03-10")) == [1, 2, 3]
+    assert ids(index.medicines_on("2024-03-11")) == [3, 4]
+    assert ids(index.medicines_between("2024-03-11", "2024-03-11")) == [3, 4]
+    assert ids(index.medicines_between("2024-01-01", "2024-03-04")) == []
+
+
+def test_schedule_index_skips_unschedulable_medicines():
+    index = ScheduleIndex([
+        medicine(1, start_date="2024-03-15", end_date="2024-03-10"),
+        medicine(2, start_date="2024-03-10"),
+        medicine(3, "Daily (Ongoing)", paused=True),
+        medicine(4, "Daily (Ongoing)", times=()),
+        medicine(5, "As needed"),
+    ])
+    for target_date in ("2024-03-09", "2024-03-10", "2024-03-12", "2024-03-15", "2024-03-16"):
+        assert index.medicines_on(target_date) == ()
+    assert index.medicines_between("2024-01-01", "2024-12-31") == []
+
+
+def test_schedule_index_matches_is_scheduled_scan():
+    rnd = random.Random(13)
+    first_day = date(2024, 1, 1)
+    days = [(first_day + timedelta(days=n)).strftime('%Y-%m-%d') for n in range(60)]
+    medicines = []
+    for med_id in range(1, 81):
+        start, end = rnd.choice(days), rnd.choice(days)
+        med_type = rnd.choice(["Date Range"] * 4 + ["Daily (Ongoing)"])
+        medicines.append(medicine(med_id, med_type, start, end, paused=rnd.random() < 0.1))
+    index = ScheduleIndex(medicines)
+
+    for target_date in days:
+        assert ids(index.medicines_on(target_date)) == [med.id for med in medicines if med.is_scheduled(target_date)]
+    for _ in range(200):
+        start, end = sorted(rnd.sample(days, 2))
+        window = [d for d in days if start <= d <= end]
+        expected = [med.id for med in medicines if any(med.is_scheduled(d) for d in window)]
+        assert ids(index.medicines_between(start, end)) == expected
+
+
+def test_schedule_index_survives_intake_toggles(user_id, add_medicine):
+    med = add_medicine()
+    index = get_schedule_index(user_id)
+
+    toggle_intake(med.id, days_from_today(0), "08:00")
+    assert get_schedule_index(user_id) is index
+
+    toggle_medicine_pause(med.id)
+    assert get_schedule_index(user_id) is not index
+    assert get_schedule_index(user_id).medicines_on(days_from_today(0)) == ()